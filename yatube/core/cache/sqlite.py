@@ -0,0 +1,270 @@
+"""Кэш в файле SQLite (WAL), общий для всех процессов на машине.
+
+В отличие от LocMemCache все воркеры видят одни и те же данные
+(и одну и ту же инвалидацию), а память не дублируется. Поддерживает
+TTL, вытеснение давно не читанных ключей при превышении MAX_SIZE байт
+или MAX_ENTRIES записей и атомарный incr.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+
+from .. import stats as request_stats
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed);
+CREATE TABLE IF NOT EXISTS cache_stats (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    entries INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO cache_stats VALUES (1, 0, 0);
+CREATE TRIGGER IF NOT EXISTS cache_insert AFTER INSERT ON cache BEGIN
+    UPDATE cache_stats SET entries = entries + 1, size = size + new.size;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_delete AFTER DELETE ON cache BEGIN
+    UPDATE cache_stats SET entries = entries - 1, size = size - old.size;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_update AFTER UPDATE OF size ON cache
+BEGIN
+    UPDATE cache_stats SET size = size - old.size + new.size;
+END;
+'''
+UPSERT = '''
+INSERT INTO cache VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (key) DO UPDATE SET value = excluded.value,
+    expires = excluded.expires, accessed = excluded.accessed,
+    size = excluded.size
+'''
+# как часто (в секундах) обновлять время последнего чтения ключа:
+# запись на каждый get сделала бы чтение из кэша конкурентной записью
+ACCESS_RESOLUTION = 30
+
+
+def connect(path, schema=SCHEMA):
+    """Соединение с файлом SQLite в режиме WAL для общего доступа
+    нескольких процессов.
+    """
+    connection = sqlite3.connect(path, timeout=30, isolation_level=None,
+                                 check_same_thread=False)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    connection.executescript(schema)
+    return connection
+
+
+class ConnectionPerThread(threading.local):
+    """Своё соединение у каждого потока; после fork — новое."""
+    def __init__(self, path, schema=SCHEMA):
+        self.path = path
+        self.schema = schema
+        self.pid = None
+        self.connection = None
+
+    def get(self):
+        if self.pid != os.getpid():
+            self.connection = connect(self.path, self.schema)
+            self.pid = os.getpid()
+        return self.connection
+
+
+@contextmanager
+def immediate(connection):
+    """BEGIN IMMEDIATE ... COMMIT: чтение-изменение-запись без гонок
+    между процессами.
+    """
+    connection.execute('BEGIN IMMEDIATE')
+    try:
+        yield connection
+    except BaseException:
+        connection.execute('ROLLBACK')
+        raise
+    connection.execute('COMMIT')
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._max_size = int(options.get('MAX_SIZE', 256 * 1024 * 1024))
+        if 'MAX_ENTRIES' not in options:
+            self._max_entries = 1000000
+        directory = os.path.dirname(location)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = ConnectionPerThread(location)
+
+    @property
+    def _db(self):
+        return self._local.get()
+
+    @staticmethod
+    def _dumps(value):
+        # целые храним как есть, чтобы incr работал одним UPDATE
+        if type(value) is int and -2 ** 63 <= value < 2 ** 63:
+            return value
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _loads(value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    @staticmethod
+    def _size(key, value):
+        return len(key) + (len(value) if isinstance(value, bytes) else 8)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _row(self, key, value, timeout, now):
+        value = self._dumps(value)
+        return (key, value, self.get_backend_timeout(timeout), now,
+                self._size(key, value))
+
+    def get_backend_timeout(self, timeout=DEFAULT_TIMEOUT):
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is None:
+            return None
+        return time.time() + timeout
+
+    def _touch_accessed(self, keys, now):
+        self._db.executemany(
+            'UPDATE cache SET accessed = ? WHERE key = ?',
+            [(now, key) for key in keys],
+        )
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        return self._get_many([key]).get(key, default)
+
+    def _get_many(self, keys):
+        if not keys:
+            return {}
+        now = time.time()
+        placeholders = ', '.join('?' * len(keys))
+        rows = self._db.execute(
+            'SELECT key, value, expires, accessed FROM cache '
+            f'WHERE key IN ({placeholders})', keys
+        ).fetchall()
+        result = {}
+        stale = []
+        for key, value, expires, accessed in rows:
+            if expires is not None and expires <= now:
+                continue
+            result[key] = self._loads(value)
+            if accessed < now - ACCESS_RESOLUTION:
+                stale.append(key)
+        if stale:
+            self._touch_accessed(stale, now)
+        request_stats.record_cache(len(result), len(keys) - len(result))
+        return result
+
+    def get_many(self, keys, version=None):
+        mapping = {self._key(key, version): key for key in keys}
+        found = self._get_many(list(mapping))
+        return {mapping[key]: value for key, value in found.items()}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        rows = [self._row(self._key(key, version), value, timeout, now)
+                for key, value in data.items()]
+        with immediate(self._db) as db:
+            db.executemany(UPSERT, rows)
+            self._cull(db, now)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with immediate(self._db) as db:
+            db.execute('DELETE FROM cache WHERE key = ? AND expires <= ?',
+                       (key, now))
+            added = db.execute(
+                'INSERT OR IGNORE INTO cache VALUES (?, ?, ?, ?, ?)',
+                self._row(key, value, timeout, now)
+            ).rowcount
+            if added:
+                self._cull(db, now)
+        return bool(added)
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        with immediate(self._db) as db:
+            updated = db.execute(
+                'UPDATE cache SET value = value + ? WHERE key = ? '
+                "AND typeof(value) = 'integer' "
+                'AND (expires IS NULL OR expires > ?)',
+                (delta, key, time.time())
+            ).rowcount
+            if not updated:
+                raise ValueError(f"Key '{key}' not found")
+            return db.execute(
+                'SELECT value FROM cache WHERE key = ?', (key,)
+            ).fetchone()[0]
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        return bool(self._db.execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), key, time.time())
+        ).rowcount)
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        return self._db.execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)', (key, time.time())
+        ).fetchone() is not None
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        keys = [(self._key(key, version),) for key in keys]
+        self._db.executemany('DELETE FROM cache WHERE key = ?', keys)
+
+    def clear(self):
+        self._db.execute('DELETE FROM cache')
+
+    def _cull(self, db, now):
+        """Сначала выбрасывает просроченное, затем давно не читанное,
+        пока кэш не уложится в MAX_SIZE и MAX_ENTRIES.
+        """
+        entries, size = db.execute(
+            'SELECT entries, size FROM cache_stats'
+        ).fetchone()
+        if entries <= self._max_entries and size <= self._max_size:
+            return
+        db.execute('DELETE FROM cache WHERE expires <= ?', (now,))
+        while True:
+            entries, size = db.execute(
+                'SELECT entries, size FROM cache_stats'
+            ).fetchone()
+            if entries <= self._max_entries and size <= self._max_size:
+                return
+            db.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'ORDER BY accessed LIMIT ?)',
+                (max(entries // self._cull_frequency, 1),)
+            )
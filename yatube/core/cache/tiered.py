@@ -0,0 +1,253 @@
+"""Двухуровневый кэш: LRU в памяти процесса перед общим кэшем.
+
+Горячие ключи читаются из памяти без похода в общий кэш. Локальная
+копия живёт не дольше LOCAL_TIMEOUT секунд. Удалённые ключи пишутся
+в общий журнал под порядковыми номерами; остальные процессы читают
+новые записи (не реже раза в GENERATION_CHECK секунд) и убирают у себя
+только эти ключи. Весь уровень сбрасывается, лишь если журнал успел
+устареть.
+"""
+import pickle
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+
+from .. import metrics, stats as request_stats
+
+# номер последней записи журнала удалений; сами записи лежат
+# под ключами 'tiered:deleted:<номер>'
+DELETED_KEY = 'tiered:deleted'
+# сколько секунд хранится запись журнала
+DELETED_TIMEOUT = 300
+# при большем отставании процесс сбрасывает уровень целиком
+DELETED_BACKLOG = 100
+MISSING = object()
+# локальные уровни общие для всех потоков процесса, как у LocMemCache
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+class LocalStore:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.generation = None
+        self.checked = 0
+        self.stats = Counter()
+
+    def get(self, key, now):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return MISSING
+            expires, data = entry
+            if expires <= now:
+                self._pop(key)
+                return MISSING
+            self.entries.move_to_end(key)
+        return pickle.loads(data)
+
+    def put(self, key, value, expires, max_entries, max_bytes):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(data) > max_bytes:
+            return
+        with self.lock:
+            self._pop(key)
+            self.entries[key] = (expires, data)
+            self.bytes += len(data)
+            while (len(self.entries) > max_entries
+                   or self.bytes > max_bytes):
+                self._pop(next(iter(self.entries)))
+
+    def pop(self, key):
+        with self.lock:
+            self._pop(key)
+
+    def _pop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= len(entry[1])
+
+    def flush(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+
+class TieredCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = location or 'default'
+        self._max_bytes = int(options.get('MAX_BYTES', 16 * 1024 * 1024))
+        self._local_timeout = float(options.get('LOCAL_TIMEOUT', 5))
+        self._check_interval = float(options.get('GENERATION_CHECK', 1))
+        with _stores_lock:
+            self._store = _stores.setdefault(location, LocalStore())
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def stats(self):
+        """Попадания по уровням в этом процессе и их доли."""
+        counts = dict(self._store.stats)
+        total = sum(counts.values()) or 1
+        return {
+            'local_hits': counts.get('local', 0),
+            'shared_hits': counts.get('shared', 0),
+            'misses': counts.get('miss', 0),
+            'local_ratio': counts.get('local', 0) / total,
+            'shared_ratio': counts.get('shared', 0) / total,
+            'entries': len(self._store.entries),
+            'bytes': self._store.bytes,
+        }
+
+    def _count(self, tiers):
+        self._store.stats.update(tiers)
+        for tier, count in tiers.items():
+            if count:
+                metrics.inc('yatube_tiered_cache_requests_total', count,
+                            tier=tier)
+
+    def _sync(self, now):
+        """Убирает из локального уровня ключи, которые другие процессы
+        удалили из общего кэша после прошлой проверки.
+        """
+        store = self._store
+        if now - store.checked < self._check_interval:
+            return
+        store.checked = now
+        seen, current = store.generation, self.shared.get(DELETED_KEY, 0)
+        if current == seen:
+            return
+        store.generation = current
+        if seen is None:
+            # первая проверка: в уровне только то, что процесс сам записал
+            return
+        if not 0 < current - seen <= DELETED_BACKLOG:
+            store.flush()
+            return
+        numbers = range(seen + 1, current + 1)
+        entries = self.shared.get_many(
+            [f'{DELETED_KEY}:{number}' for number in numbers]
+        )
+        if len(entries) < current - seen:
+            # запись истекла или ещё не дописана: что удалено, неизвестно
+            store.flush()
+            return
+        for keys in entries.values():
+            for key in keys:
+                store.pop(key)
+
+    def _log_deleted(self, keys):
+        try:
+            number = self.shared.incr(DELETED_KEY)
+        except ValueError:
+            number = 1
+            if not self.shared.add(DELETED_KEY, number, None):
+                number = self.shared.incr(DELETED_KEY)
+        self.shared.set(f'{DELETED_KEY}:{number}', keys, DELETED_TIMEOUT)
+
+    def _local_expires(self, timeout, now):
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is None:
+            return now + self._local_timeout
+        return now + min(timeout, self._local_timeout)
+
+    def _remember(self, key, value, timeout, now):
+        self._store.put(key, value, self._local_expires(timeout, now),
+                        self._max_entries, self._max_bytes)
+
+    # Ключи в общий кэш уходят уже с префиксом и версией этого кэша,
+    # чтобы не пересекаться с другими пользователями общего кэша.
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        now = time.time()
+        self._sync(now)
+        keys = {self.make_key(key, version): key for key in keys}
+        found = {}
+        missing = []
+        for key in keys:
+            value = self._store.get(key, now)
+            if value is MISSING:
+                missing.append(key)
+            else:
+                found[key] = value
+        # попадания и промахи общего кэша он посчитает сам
+        request_stats.record_cache(len(found), 0)
+        tiers = {'local': len(found)}
+        if missing:
+            shared = self.shared.get_many(missing)
+            tiers.update(shared=len(shared), miss=len(missing) - len(shared))
+            for key, value in shared.items():
+                self._remember(key, value, DEFAULT_TIMEOUT, now)
+            found.update(shared)
+        self._count(tiers)
+        return {keys[key]: value for key, value in found.items()}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self.get_backend_timeout(timeout)
+        data = {self.make_key(key, version): value
+                for key, value in data.items()}
+        failed = self.shared.set_many(data, timeout) or []
+        now = time.time()
+        for key, value in data.items():
+            if key not in failed:
+                self._remember(key, value, timeout, now)
+        return failed
+
+    def get_backend_timeout(self, timeout=DEFAULT_TIMEOUT):
+        # таймаут передаётся общему кэшу как есть, в секундах
+        if timeout == DEFAULT_TIMEOUT:
+            return self.default_timeout
+        return timeout
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version)
+        timeout = self.get_backend_timeout(timeout)
+        added = self.shared.add(key, value, timeout)
+        if added:
+            self._remember(key, value, timeout, time.time())
+        return added
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version)
+        self._store.pop(key)
+        return self.shared.incr(key, delta)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(self.make_key(key, version),
+                                 self.get_backend_timeout(timeout))
+
+    def has_key(self, key, version=None):
+        return self.get(key, MISSING, version) is not MISSING
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_key(key, version) for key in keys]
+        self.shared.delete_many(keys)
+        for key in keys:
+            self._store.pop(key)
+        self._log_deleted(keys)
+
+    def clear(self):
+        # журнал пропадает вместе с общим кэшем; номер записи прыгает
+        # дальше DELETED_BACKLOG, чтобы остальные сбросили свой уровень
+        number = self.shared.get(DELETED_KEY, 0)
+        self.shared.clear()
+        self._store.flush()
+        self.shared.add(DELETED_KEY, number + DELETED_BACKLOG + 1, None)
@@ -0,0 +1,59 @@
+"""«Дырки» в закэшированных страницах.
+
+Страница кэшируется одна на всех пользователей, а зависящие от
+пользователя фрагменты (шапка, кнопка подписки, форма комментария)
+вместо себя оставляют метку <!--hole:...-->. Метки заполняются
+на каждый запрос функцией fill().
+"""
+import json
+import re
+
+from django.template.loader import render_to_string
+from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
+
+FRAGMENTS = {}
+HOLE_RE = re.compile(r'<!--hole:([A-Za-z0-9_-]+)-->')
+
+
+def fragment(name, template):
+    """Регистрирует фрагмент: builder(request, **params) возвращает
+    контекст для шаблона template.
+    """
+    def decorator(builder):
+        FRAGMENTS[name] = (template, builder)
+        return builder
+    return decorator
+
+
+def render_fragment(request, name, params):
+    template, builder = FRAGMENTS[name]
+    return render_to_string(template, builder(request, **params),
+                            request=request)
+
+
+def placeholder(name, params):
+    payload = json.dumps([name, params], separators=(',', ':'))
+    return f'<!--hole:{urlsafe_base64_encode(payload.encode())}-->'
+
+
+def fill(content, request):
+    """Подставляет в страницу фрагменты текущего пользователя."""
+    def replace(match):
+        try:
+            name, params = json.loads(urlsafe_base64_decode(match[1]))
+        except ValueError:
+            return ''
+        if name not in FRAGMENTS:
+            return ''
+        return render_fragment(request, name, params)
+    return HOLE_RE.sub(replace, content)
+
+
+@fragment('header', 'includes/header.html')
+def header(request):
+    return {}
+
+
+@fragment('switcher', 'includes/switcher.html')
+def switcher(request, active=None):
+    return {active: True} if active else {}
@@ -0,0 +1,103 @@
+import multiprocessing
+import os
+import tempfile
+import time
+
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from core.cache.sqlite import SQLiteCache
+
+PARAMS = {'TIMEOUT': 300, 'OPTIONS': {'MAX_ENTRIES': 10 ** 6}}
+
+
+def make_backends(directory):
+    return {
+        'locmem': LocMemCache('benchmark', PARAMS),
+        'filebased': FileBasedCache(os.path.join(directory, 'files'),
+                                    PARAMS),
+        'sqlite': SQLiteCache(os.path.join(directory, 'cache.sqlite3'),
+                              PARAMS),
+    }
+
+
+def timed(operation, count):
+    started = time.perf_counter()
+    operation()
+    return count / (time.perf_counter() - started)
+
+
+def incr_worker(backend, key, count):
+    for _ in range(count):
+        backend.incr(key)
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает SQLiteCache с LocMemCache и FileBasedCache: '
+            'операций в секунду и корректность incr из нескольких процессов')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ops', type=int, default=5000)
+        parser.add_argument('--value-size', type=int, default=2048)
+        parser.add_argument('--processes', type=int, default=4)
+
+    def handle(self, *args, **options):
+        ops = options['ops']
+        value = 'x' * options['value_size']
+        keys = [f'key:{number}' for number in range(ops)]
+        with tempfile.TemporaryDirectory() as directory:
+            backends = make_backends(directory)
+            self.stdout.write(
+                f'{"backend":<10}{"set/s":>10}{"get/s":>10}'
+                f'{"miss/s":>10}{"incr/s":>10}{"get_many/s":>12}'
+            )
+            for name, backend in backends.items():
+                results = self.run_single(backend, keys, value)
+                self.stdout.write(
+                    f'{name:<10}' + ''.join(f'{r:>10.0f}' for r in results[:4])
+                    + f'{results[4]:>12.0f}'
+                )
+            self.stdout.write(
+                f'\nincr из {options["processes"]} процессов:'
+            )
+            for name in ('filebased', 'sqlite'):
+                expected, actual, rate = self.run_shared(
+                    backends[name], ops, options['processes']
+                )
+                self.stdout.write(
+                    f'{name:<10} ожидалось {expected}, получено {actual}, '
+                    f'{rate:.0f} incr/s'
+                )
+
+    def run_single(self, backend, keys, value):
+        backend.clear()
+        count = len(keys)
+        batches = [keys[i:i + 10] for i in range(0, count, 10)]
+        backend.set('counter', 0)
+        return (
+            timed(lambda: [backend.set(key, value) for key in keys], count),
+            timed(lambda: [backend.get(key) for key in keys], count),
+            timed(lambda: [backend.get(key + ':miss') for key in keys],
+                  count),
+            timed(lambda: [backend.incr('counter') for key in keys], count),
+            timed(lambda: [backend.get_many(batch) for batch in batches],
+                  len(batches)),
+        )
+
+    def run_shared(self, backend, ops, processes):
+        backend.set('shared', 0)
+        per_process = ops // processes
+        workers = [
+            multiprocessing.Process(target=incr_worker,
+                                    args=(backend, 'shared', per_process))
+            for _ in range(processes)
+        ]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+        expected = per_process * processes
+        return expected, backend.get('shared'), expected / elapsed
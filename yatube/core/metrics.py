@@ -0,0 +1,257 @@
+"""Метрики в формате Prometheus, общие для всех процессов.
+
+Каждый процесс копит приращения у себя, а фоновый поток раз в
+FLUSH_INTERVAL секунд сливает их одной транзакцией в файл SQLite
+METRICS_DB (WAL, как core.cache.sqlite); остаток дописывается при
+выходе из процесса. /metrics отдаёт сумму по всем процессам, поэтому
+неважно, какой воркер принял запрос.
+
+Гистограммы хранят число наблюдений в каждой корзине отдельно,
+накопленные значения le считаются при выдаче.
+"""
+import atexit
+import bisect
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+
+from .cache.sqlite import ConnectionPerThread, immediate
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS metrics (
+    name TEXT NOT NULL,
+    labels TEXT NOT NULL,
+    le TEXT NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (name, labels, le)
+) WITHOUT ROWID;
+'''
+UPSERT = '''
+INSERT INTO metrics VALUES (?, ?, ?, ?)
+ON CONFLICT (name, labels, le) DO UPDATE SET value = value + excluded.value
+'''
+# секунд между записями накопленного в общий файл
+FLUSH_INTERVAL = 1
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+THUMBNAIL_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# имя -> (тип, описание, границы корзин для гистограмм)
+METRICS = {
+    'yatube_http_request_duration_seconds': (
+        'histogram', 'Время ответа по имени URL', LATENCY_BUCKETS,
+    ),
+    'yatube_http_responses_total': (
+        'counter', 'Ответы по имени URL и коду статуса', None,
+    ),
+    'yatube_db_queries_total': (
+        'counter', 'Запросы к базе по имени URL', None,
+    ),
+    'yatube_db_duplicate_queries_total': (
+        'counter', 'Повторные запросы к базе с теми же параметрами', None,
+    ),
+    'yatube_db_query_duration_seconds_total': (
+        'counter', 'Время запросов к базе по имени URL', None,
+    ),
+    'yatube_cache_requests_total': (
+        'counter', 'Чтения ключей кэша: result="hit" или "miss"', None,
+    ),
+    'yatube_tiered_cache_requests_total': (
+        'counter', 'Чтения двухуровневого кэша по уровню, где нашёлся '
+        'ключ: tier="local", "shared" или "miss"', None,
+    ),
+    'yatube_page_cache_requests_total': (
+        'counter', 'Страничный кэш по view: result="hit" или "miss"', None,
+    ),
+    'yatube_thumbnail_duration_seconds': (
+        'histogram', 'Время создания миниатюры по геометрии',
+        THUMBNAIL_BUCKETS,
+    ),
+    'yatube_posts_created_total': ('counter', 'Созданные посты', None),
+    'yatube_comments_created_total': (
+        'counter', 'Созданные комментарии', None,
+    ),
+    'yatube_follows_created_total': ('counter', 'Новые подписки', None),
+}
+# из этих пространств имён URL имя идёт в метку view как есть,
+# остальные запросы попадают в view="other"
+VIEW_NAMESPACES = ('posts', 'users', 'about')
+
+_lock = threading.Lock()
+_buffer = Counter()
+_pid = None
+_connections = {}
+
+
+def _db():
+    path = settings.METRICS_DB
+    local = _connections.get(path)
+    if local is None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        local = _connections.setdefault(
+            path, ConnectionPerThread(path, SCHEMA)
+        )
+    return local.get()
+
+
+def _escape(value):
+    return (str(value).replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n'))
+
+
+def _labels(labels):
+    return ','.join(f'{name}="{_escape(value)}"'
+                    for name, value in sorted(labels.items()))
+
+
+def _flush_periodically():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        flush()
+
+
+def _add(increments):
+    global _pid
+    with _lock:
+        if _pid != os.getpid():
+            # после fork накопленное принадлежит родителю, а его
+            # поток записи в дочерний процесс не переходит
+            _buffer.clear()
+            _pid = os.getpid()
+            threading.Thread(target=_flush_periodically, daemon=True,
+                             name='metrics-flush').start()
+        _buffer.update(increments)
+
+
+def inc(name, value=1, **labels):
+    _add({(name, _labels(labels), ''): value})
+
+
+def _histogram(name, labels, value):
+    """Приращения гистограммы name для одного наблюдения."""
+    bounds = METRICS[name][2]
+    index = bisect.bisect_left(bounds, value)
+    le = str(bounds[index]) if index < len(bounds) else '+Inf'
+    return {(name, labels, le): 1, (f'{name}_sum', labels, ''): value,
+            (f'{name}_count', labels, ''): 1}
+
+
+def observe(name, value, **labels):
+    _add(_histogram(name, _labels(labels), value))
+
+
+def flush():
+    """Сливает накопленное процессом в общий файл."""
+    with _lock:
+        rows = [(*key, value) for key, value in _buffer.items()]
+        _buffer.clear()
+    if not rows:
+        return
+    try:
+        with immediate(_db()) as db:
+            db.executemany(UPSERT, rows)
+    except sqlite3.Error:
+        logger.exception('Не удалось записать метрики')
+        with _lock:
+            _buffer.update({row[:3]: row[3] for row in rows})
+
+
+atexit.register(flush)
+
+
+def view_label(match):
+    if match and match.namespace in VIEW_NAMESPACES:
+        return match.view_name
+    return 'other'
+
+
+def record_request(match, status, values):
+    """Показатели запроса из core.stats.RequestStats.metrics()."""
+    view = view_label(match)
+    labels = _labels({'view': view})
+    # одно обращение к буферу на запрос
+    _add({
+        **_histogram('yatube_http_request_duration_seconds', labels,
+                     values['wall_ms'] / 1000),
+        ('yatube_http_responses_total',
+         _labels({'view': view, 'status': status}), ''): 1,
+        ('yatube_db_queries_total', labels, ''): values['queries'],
+        ('yatube_db_duplicate_queries_total', labels, ''):
+            values['duplicate_queries'],
+        ('yatube_db_query_duration_seconds_total', labels, ''):
+            values['db_ms'] / 1000,
+        ('yatube_cache_requests_total', 'result="hit"', ''):
+            values['cache_hits'],
+        ('yatube_cache_requests_total', 'result="miss"', ''):
+            values['cache_misses'],
+    })
+
+
+def _sample(name, labels, value):
+    value = int(value) if float(value).is_integer() else repr(value)
+    if labels:
+        return f'{name}{{{labels}}} {value}'
+    return f'{name} {value}'
+
+
+def render():
+    """Все метрики в текстовом формате Prometheus."""
+    flush()
+    samples = {}
+    for name, labels, le, value in _db().execute(
+        'SELECT name, labels, le, value FROM metrics'
+    ):
+        samples.setdefault(name, {}).setdefault(labels, {})[le] = value
+    lines = []
+    for name, (kind, description, bounds) in METRICS.items():
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} {kind}']
+        if kind != 'histogram':
+            for labels, values in sorted(samples.get(name, {}).items()):
+                lines.append(_sample(name, labels, values['']))
+            continue
+        buckets = samples.get(name, {})
+        for labels in sorted(buckets):
+            total = 0
+            for le in [*map(str, bounds), '+Inf']:
+                total += buckets[labels].get(le, 0)
+                lines.append(_sample(
+                    f'{name}_bucket',
+                    ','.join(filter(None, [labels, f'le="{le}"'])), total,
+                ))
+            for suffix in ('sum', 'count'):
+                lines.append(_sample(
+                    f'{name}_{suffix}', labels,
+                    samples.get(f'{name}_{suffix}', {})
+                    .get(labels, {}).get('', 0),
+                ))
+    cache = {labels: values[''] for labels, values in
+             samples.get('yatube_cache_requests_total', {}).items()}
+    hits = cache.get('result="hit"', 0)
+    lookups = hits + cache.get('result="miss"', 0)
+    lines += [
+        '# HELP yatube_cache_hit_ratio Доля попаданий в кэш',
+        '# TYPE yatube_cache_hit_ratio gauge',
+        _sample('yatube_cache_hit_ratio', '',
+                hits / lookups if lookups else 0),
+    ]
+    tiers = {labels: values[''] for labels, values in
+             samples.get('yatube_tiered_cache_requests_total', {}).items()}
+    lookups = sum(tiers.values())
+    lines += [
+        '# HELP yatube_tiered_cache_hit_ratio Доля чтений двухуровневого '
+        'кэша, найденных на этом уровне',
+        '# TYPE yatube_tiered_cache_hit_ratio gauge',
+    ]
+    for tier in ('local', 'shared'):
+        hits = tiers.get(f'tier="{tier}"', 0)
+        lines.append(_sample('yatube_tiered_cache_hit_ratio',
+                             f'tier="{tier}"',
+                             hits / lookups if lookups else 0))
+    return '\n'.join(lines) + '\n'
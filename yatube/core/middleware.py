@@ -0,0 +1,48 @@
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics, stats
+
+
+class StatsMiddleware:
+    """Собирает показатели каждого запроса по имени представления
+    (см. core.stats), передаёт их в метрики Prometheus (core.metrics)
+    и при REQUEST_STATS_SERVER_TIMING отдаёт в заголовке Server-Timing.
+
+    Стоит первой в MIDDLEWARE, чтобы время запроса включало
+    остальные промежуточные слои.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_stats = stats.start()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(request_stats)
+                    )
+                response = self.get_response(request)
+        finally:
+            stats.stop()
+        values = request_stats.metrics()
+        match = request.resolver_match
+        stats.observe(match.view_name if match else '-', values)
+        metrics.record_request(match, response.status_code, values)
+        if settings.REQUEST_STATS_SERVER_TIMING:
+            response['Server-Timing'] = server_timing(values)
+        return response
+
+
+def server_timing(values):
+    return ', '.join([
+        f'total;dur={values["wall_ms"]:.1f}',
+        f'db;dur={values["db_ms"]:.1f};desc="{values["queries"]} '
+        f'queries, {values["duplicate_queries"]} duplicate"',
+        f'tpl;dur={values["template_ms"]:.1f}',
+        f'cache;desc="{values["cache_hits"]} hits, '
+        f'{values["cache_misses"]} misses"',
+    ])
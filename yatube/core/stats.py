@@ -0,0 +1,196 @@
+"""Статистика запросов по представлениям: время, работа с базой,
+кэшем и шаблонами.
+
+Показатели одного запроса собирает RequestStats, пока его
+обрабатывает core.middleware.StatsMiddleware; кэши и шаблоны
+сообщают о себе через record_cache и TimedDjangoTemplates. Итоги
+копятся в памяти процесса в гистограммах с фиксированными границами:
+память не растёт с числом запросов, запись стоит один bisect.
+"""
+import bisect
+import threading
+import time
+
+from django.template.backends import django as django_backend
+
+# границы корзин гистограмм; последняя корзина — всё, что больше
+TIME_BOUNDS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+COUNT_BOUNDS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+METRICS = {
+    'wall_ms': TIME_BOUNDS,
+    'db_ms': TIME_BOUNDS,
+    'template_ms': TIME_BOUNDS,
+    'queries': COUNT_BOUNDS,
+    'duplicate_queries': COUNT_BOUNDS,
+    'cache_hits': COUNT_BOUNDS,
+    'cache_misses': COUNT_BOUNDS,
+}
+
+_current = threading.local()
+_lock = threading.Lock()
+_views = {}
+_started = time.time()
+
+
+class Histogram:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, share):
+        """Верхняя граница корзины, в которую попадает доля share
+        наблюдений; для последней корзины — наибольшее значение.
+        """
+        if not self.count:
+            return None
+        rank = share * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else None,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'max': self.max,
+            'buckets': dict(zip(
+                [*map(str, self.bounds), 'inf'], self.counts
+            )),
+        }
+
+
+class RequestStats:
+    """Показатели одного запроса. Служит и обёрткой execute_wrapper
+    для соединений с базой.
+    """
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_time = 0
+        self.template_time = 0
+        self.rendering = False
+        self.queries = 0
+        self.statements = set()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+            if not many:
+                # повтором считается тот же SQL с теми же параметрами
+                try:
+                    self.statements.add((sql, tuple(params or ())))
+                except TypeError:
+                    self.statements.add((sql, repr(params)))
+
+    @property
+    def duplicate_queries(self):
+        return self.queries - len(self.statements)
+
+    def metrics(self):
+        return {
+            'wall_ms': (time.perf_counter() - self.started) * 1000,
+            'db_ms': self.db_time * 1000,
+            'template_ms': self.template_time * 1000,
+            'queries': self.queries,
+            'duplicate_queries': self.duplicate_queries,
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+        }
+
+
+def start():
+    _current.stats = RequestStats()
+    return _current.stats
+
+
+def stop():
+    _current.stats = None
+
+
+def current():
+    return getattr(_current, 'stats', None)
+
+
+def record_cache(hits, misses):
+    """Вызывается кэшами на каждое чтение."""
+    stats = current()
+    if stats is not None:
+        stats.cache_hits += hits
+        stats.cache_misses += misses
+
+
+def observe(view, metrics):
+    with _lock:
+        histograms = _views.get(view)
+        if histograms is None:
+            histograms = _views[view] = {
+                name: Histogram(bounds) for name, bounds in METRICS.items()
+            }
+        for name, value in metrics.items():
+            histograms[name].observe(value)
+
+
+def snapshot():
+    """Копия накопленной статистики этого процесса."""
+    with _lock:
+        views = {
+            view: {name: histogram.as_dict()
+                   for name, histogram in histograms.items()}
+            for view, histograms in _views.items()
+        }
+    return {'since': _started, 'views': views}
+
+
+def reset():
+    global _started
+    with _lock:
+        _views.clear()
+        _started = time.time()
+
+
+class Template(django_backend.Template):
+    def render(self, context=None, request=None):
+        stats = current()
+        if stats is None or stats.rendering:
+            return super().render(context, request)
+        stats.rendering = True
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats.template_time += time.perf_counter() - started
+            stats.rendering = False
+
+
+class TimedDjangoTemplates(django_backend.DjangoTemplates):
+    """DjangoTemplates, который засекает время отрисовки шаблонов.
+
+    Шаблоны, которые рисуются внутри другого (render_to_string из
+    тегов), отдельно не считаются.
+    """
+    def from_string(self, template_code):
+        return Template(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return Template(super().get_template(template_name).template, self)
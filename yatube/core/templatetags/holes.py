@@ -0,0 +1,20 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from core.holes import placeholder, render_fragment
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def hole(context, name, **params):
+    """Фрагмент, зависящий от пользователя.
+
+    При рендере страницы для общего кэша выводит метку, которую
+    core.holes.fill() заполнит на каждый запрос; иначе рендерит
+    фрагмент сразу.
+    """
+    request = context.get('request')
+    if getattr(request, 'punch_holes', False):
+        return mark_safe(placeholder(name, params))
+    return render_fragment(request, name, params)
@@ -0,0 +1,71 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+from django.test import SimpleTestCase
+
+from core.cache.sqlite import SQLiteCache
+
+
+def incr_many(cache, count):
+    for _ in range(count):
+        cache.incr('counter')
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = SQLiteCache(self.path, {})
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_set_get_delete(self):
+        self.cache.set('key', {'value': [1, 2]})
+        self.assertEqual(self.cache.get('key'), {'value': [1, 2]})
+        self.assertEqual(self.cache.get_many(['key', 'none']),
+                         {'key': {'value': [1, 2]}})
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_ttl(self):
+        self.cache.set('short', 1, timeout=0.05)
+        self.cache.set('forever', 1, timeout=None)
+        time.sleep(0.1)
+        self.assertIsNone(self.cache.get('short'))
+        self.assertTrue(self.cache.add('short', 2))
+        self.assertFalse(self.cache.add('forever', 2))
+        self.assertEqual(self.cache.get('forever'), 1)
+
+    def test_incr(self):
+        self.cache.set('counter', 1)
+        self.assertEqual(self.cache.incr('counter', 5), 6)
+        self.assertEqual(self.cache.decr('counter'), 5)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_lru_eviction_by_size(self):
+        cache = SQLiteCache(self.path, {'OPTIONS': {'MAX_SIZE': 10000}})
+        cache.set('old', 'x' * 4000)
+        cache.set('fresh', 'x' * 4000)
+        cache.set('newest', 'x' * 4000)
+        self.assertIsNone(cache.get('old'))
+        self.assertIsNotNone(cache.get('newest'))
+
+    def test_shared_between_processes(self):
+        """incr из нескольких процессов не теряет обновлений."""
+        self.cache.set('counter', 0)
+        workers = [
+            multiprocessing.Process(target=incr_many,
+                                    args=(self.cache, 50))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        other = SQLiteCache(self.path, {})
+        self.assertEqual(other.get('counter'), 200)
@@ -0,0 +1,131 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from core import metrics
+from posts.models import Post
+
+User = get_user_model()
+
+
+def created_in_child(count):
+    for _ in range(count):
+        metrics.inc('yatube_posts_created_total')
+    metrics.flush()
+
+
+class MetricsStoreMixin:
+    def setUp(self):
+        super().setUp()
+        # накопленное другими тестами уходит в обычный файл
+        metrics.flush()
+        self.directory = tempfile.mkdtemp()
+        self.settings = override_settings(
+            METRICS_DB=os.path.join(self.directory, 'metrics.sqlite3')
+        )
+        self.settings.enable()
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.directory, ignore_errors=True)
+        super().tearDown()
+
+
+class MetricsTests(MetricsStoreMixin, SimpleTestCase):
+    def test_processes_are_summed(self):
+        metrics.inc('yatube_posts_created_total', 2)
+        process = multiprocessing.get_context('fork').Process(
+            target=created_in_child, args=(3,)
+        )
+        process.start()
+        process.join()
+        self.assertIn('\nyatube_posts_created_total 5\n', metrics.render())
+
+    def test_histogram_is_cumulative(self):
+        for seconds in (0.07, 0.07, 40):
+            metrics.observe('yatube_thumbnail_duration_seconds', seconds,
+                            geometry='card')
+        text = metrics.render()
+        for line in (
+            'yatube_thumbnail_duration_seconds_bucket'
+            '{geometry="card",le="0.05"} 0',
+            'yatube_thumbnail_duration_seconds_bucket'
+            '{geometry="card",le="0.1"} 2',
+            'yatube_thumbnail_duration_seconds_bucket'
+            '{geometry="card",le="30"} 2',
+            'yatube_thumbnail_duration_seconds_bucket'
+            '{geometry="card",le="+Inf"} 3',
+            'yatube_thumbnail_duration_seconds_count{geometry="card"} 3',
+        ):
+            self.assertIn(line, text)
+
+    def test_flushed_in_background(self):
+        metrics.inc('yatube_follows_created_total')
+        query = ('SELECT value FROM metrics '
+                 "WHERE name = 'yatube_follows_created_total'")
+        deadline = time.monotonic() + metrics.FLUSH_INTERVAL * 5
+        while time.monotonic() < deadline:
+            if metrics._db().execute(query).fetchall():
+                break
+            time.sleep(0.05)
+        self.assertEqual(metrics._db().execute(query).fetchall(), [(1,)])
+
+    def test_label_escaping(self):
+        metrics.inc('yatube_http_responses_total', view='a"b\\c')
+        self.assertIn('{view="a\\"b\\\\c"} 1', metrics.render())
+
+
+class MetricsViewTests(MetricsStoreMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user')
+        cls.staff = User.objects.create_user(username='staff',
+                                             is_staff=True)
+
+    def test_requests_and_domain_counters(self):
+        Post.objects.create(author=self.user, text='Пост')
+        client = Client()
+        client.get(reverse('posts:index'))
+        client.get(reverse('about:author'))
+        client.get('/missing/page/')
+        text = client.get(reverse('metrics')).content.decode()
+        self.assertIn('yatube_posts_created_total 1', text)
+        self.assertIn('yatube_http_request_duration_seconds_count'
+                      '{view="posts:index"} 1', text)
+        self.assertIn('yatube_http_responses_total'
+                      '{status="200",view="about:author"} 1', text)
+        self.assertIn('yatube_http_responses_total'
+                      '{status="404",view="other"} 1', text)
+        self.assertIn('yatube_db_queries_total{view="posts:index"}', text)
+        self.assertIn('yatube_cache_hit_ratio', text)
+
+    def test_tiered_cache_by_tier(self):
+        hot = caches['hot']
+        hot.clear()
+        hot.set('key', 'value')
+        hot.get('key')
+        hot.get('absent')
+        text = metrics.render()
+        self.assertIn('yatube_tiered_cache_requests_total{tier="local"} 1',
+                      text)
+        self.assertIn('yatube_tiered_cache_requests_total{tier="miss"} 1',
+                      text)
+        self.assertIn('yatube_tiered_cache_hit_ratio{tier="local"} 0.5',
+                      text)
+
+    @override_settings(METRICS_ALLOWED_IPS=())
+    def test_local_or_staff_only(self):
+        client = Client()
+        self.assertEqual(client.get(reverse('metrics')).status_code, 403)
+        client.force_login(self.user)
+        self.assertEqual(client.get(reverse('metrics')).status_code, 403)
+        client.force_login(self.staff)
+        self.assertEqual(client.get(reverse('metrics')).status_code, 200)
@@ -0,0 +1,91 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from core import stats
+
+User = get_user_model()
+
+
+class HistogramTests(SimpleTestCase):
+    def test_buckets_and_quantiles(self):
+        histogram = stats.Histogram((1, 10, 100))
+        for value in (0.5, 5, 5, 50, 500):
+            histogram.observe(value)
+        data = histogram.as_dict()
+        self.assertEqual(data['buckets'],
+                         {'1': 1, '10': 2, '100': 1, 'inf': 1})
+        self.assertEqual(data['p50'], 10)
+        self.assertEqual(data['p99'], 500)
+        self.assertEqual(data['mean'], 112.1)
+
+    def test_duplicate_queries(self):
+        request_stats = stats.RequestStats()
+
+        def execute(sql, params, many, context):
+            return None
+
+        for params in ([1], [1], [2]):
+            request_stats(execute, 'SELECT %s', params, False, {})
+        self.assertEqual(request_stats.queries, 3)
+        self.assertEqual(request_stats.duplicate_queries, 1)
+
+
+class StatsMiddlewareTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.staff = User.objects.create_user(username='staff',
+                                             is_staff=True)
+        cls.user = User.objects.create_user(username='user')
+
+    def setUp(self):
+        caches['hot'].clear()
+        stats.reset()
+        self.client = Client()
+        self.client.force_login(self.staff)
+
+    def test_stats_by_view_name(self):
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        snapshot = self.client.get(reverse('request_stats')).json()
+        index = snapshot['views']['posts:index']
+        self.assertIn('local_ratio', snapshot['caches']['hot'])
+        self.assertEqual(index['wall_ms']['count'], 2)
+        self.assertGreater(index['queries']['max'], 0)
+        self.assertGreater(index['template_ms']['max'], 0)
+        # страница кэшируется: второй раз она берётся из кэша
+        self.assertGreater(index['cache_hits']['max'], 0)
+        self.assertGreater(index['cache_misses']['max'], 0)
+
+    def test_stats_for_staff_only(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('request_stats'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_reset(self):
+        self.client.get(reverse('posts:index'))
+        self.client.post(reverse('request_stats'))
+        self.assertNotIn('posts:index', stats.snapshot()['views'])
+
+    def test_reset_needs_post_with_csrf(self):
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('request_stats') + '?reset=1')
+        self.assertIn('posts:index', stats.snapshot()['views'])
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.staff)
+        client.post(reverse('request_stats'))
+        self.assertIn('posts:index', stats.snapshot()['views'])
+
+    @override_settings(REQUEST_STATS_SERVER_TIMING=True)
+    def test_server_timing(self):
+        response = self.client.get(reverse('posts:index'))
+        self.assertRegex(response['Server-Timing'],
+                         r'^total;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ '
+                         r'queries, \d+ duplicate", tpl;dur=[\d.]+')
+
+    @override_settings(REQUEST_STATS_SERVER_TIMING=False)
+    def test_server_timing_off(self):
+        response = self.client.get(reverse('posts:index'))
+        self.assertFalse(response.has_header('Server-Timing'))
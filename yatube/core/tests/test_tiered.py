@@ -0,0 +1,74 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from core.cache import tiered
+from core.cache.tiered import TieredCache
+
+
+class TieredCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.settings = override_settings(CACHES={
+            'shared': {
+                'BACKEND': 'core.cache.sqlite.SQLiteCache',
+                'LOCATION': os.path.join(self.directory, 'cache.sqlite3'),
+            },
+        })
+        self.settings.enable()
+        tiered._stores.clear()
+        self.cache = self.make_cache()
+
+    def tearDown(self):
+        self.settings.disable()
+        tiered._stores.clear()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_cache(self, **options):
+        return TieredCache('shared', {'OPTIONS': options})
+
+    def test_local_hit_after_shared(self):
+        self.cache.set('key', [1, 2])
+        self.assertEqual(self.cache.get('key'), [1, 2])
+        self.assertEqual(self.cache.get('missing'), None)
+        stats = self.cache.stats()
+        self.assertEqual(stats['local_hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        # та же запись видна другому экземпляру через общий кэш
+        with mock.patch.object(tiered, '_stores', {}):
+            self.assertEqual(self.make_cache().get('key'), [1, 2])
+
+    def test_delete_reaches_other_processes(self):
+        self.cache.set_many({'key': 1, 'other': 2})
+        self.assertEqual(self.cache.get('key'), 1)
+        # другой процесс: свой локальный уровень, тот же общий кэш
+        with mock.patch.object(tiered, '_stores', {}):
+            other = self.make_cache(GENERATION_CHECK=0)
+            self.assertEqual(other.get_many(['key', 'other']),
+                             {'key': 1, 'other': 2})
+            self.cache.delete('key')
+            self.assertIsNone(other.get('key'))
+            # остальные ключи остаются в памяти процесса
+            self.assertEqual(other.get('other'), 2)
+            self.assertEqual(other.stats()['local_hits'], 1)
+            self.cache.clear()
+            self.assertIsNone(other.get('other'))
+
+    def test_local_copy_expires(self):
+        cache = self.make_cache(LOCAL_TIMEOUT=0)
+        cache.set('key', 1)
+        self.assertEqual(cache.get('key'), 1)
+        self.assertEqual(cache.stats()['shared_hits'], 1)
+
+    def test_bounded_by_bytes(self):
+        cache = self.make_cache(MAX_BYTES=5000)
+        for number in range(10):
+            cache.set(f'key:{number}', 'x' * 1000)
+        stats = cache.stats()
+        self.assertLessEqual(stats['bytes'], 5000)
+        self.assertLess(stats['entries'], 10)
+        # вытесненное из памяти читается из общего кэша
+        self.assertEqual(cache.get('key:0'), 'x' * 1000)
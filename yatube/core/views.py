@@ -1,4 +1,12 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render
+from django.views.decorators.http import require_http_methods
+
+from . import metrics, stats
 
 
 def page_not_found(request, exception):
@@ -17,3 +25,31 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+@staff_member_required
+@require_http_methods(['GET', 'POST'])
+def request_stats(request):
+    """Накопленная статистика запросов этого процесса по
+    представлениям; POST (с CSRF-токеном) начинает подсчёт заново.
+    """
+    snapshot = stats.snapshot()
+    # попадания по уровням у двухуровневых кэшей (TieredCache)
+    snapshot['caches'] = {alias: caches[alias].stats()
+                          for alias in settings.CACHES
+                          if hasattr(caches[alias], 'stats')}
+    if request.method == 'POST':
+        stats.reset()
+    return JsonResponse(snapshot, json_dumps_params={'indent': 2})
+
+
+def prometheus_metrics(request):
+    """Метрики всех процессов для Prometheus: только с адресов
+    METRICS_ALLOWED_IPS или для сотрудников.
+    """
+    if not (request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+            or request.user.is_staff):
+        raise PermissionDenied
+    return HttpResponse(metrics.render(),
+                        content_type='text/plain; version=0.0.4; '
+                                     'charset=utf-8')
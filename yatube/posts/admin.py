@@ -1,11 +1,39 @@
 from django.contrib import admin
 from .models import Post, Group, Comment, Follow
+from . import search
+from .utils import EstimatedCountPaginator
 
 EMPTY_VALUE = '-пусто-'
+# параметр ссылки «посчитать точно» под списком
+EXACT_COUNT = 'exact_count'
+
+
+class EstimatedCountAdmin(admin.ModelAdmin):
+    """Список без COUNT(*) по всей таблице: число записей
+    приблизительное, точное — по ссылке под списком.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    change_list_template = 'admin/estimated_change_list.html'
+
+    def changelist_view(self, request, extra_context=None):
+        # ChangeList принял бы неизвестный параметр за фильтр
+        request.exact_count = EXACT_COUNT in request.GET
+        if request.exact_count:
+            request.GET = request.GET.copy()
+            del request.GET[EXACT_COUNT]
+        return super().changelist_view(request, extra_context)
+
+    def get_paginator(self, request, queryset, per_page, orphans=0,
+                      allow_empty_first_page=True):
+        return self.paginator(
+            queryset, per_page, orphans, allow_empty_first_page,
+            exact=getattr(request, 'exact_count', False),
+        )
 
 
 @admin.register(Post)
-class PostAdmin(admin.ModelAdmin):
+class PostAdmin(EstimatedCountAdmin):
     list_display = (
         'pk',
         'text',
@@ -13,12 +41,35 @@ class PostAdmin(admin.ModelAdmin):
         'author',
         'group',
     )
-    list_editable = ('group',)
+    list_select_related = ('author', 'group')
+    autocomplete_fields = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
+    date_hierarchy = 'pub_date'
+    empty_value_display = EMPTY_VALUE
+
+    def get_search_results(self, request, queryset, search_term):
+        # поиск по индексу FTS5 вместо LIKE '%...%' по search_fields
+        return search.matching(queryset, search_term), False
+
+
+@admin.register(Group)
+class GroupAdmin(admin.ModelAdmin):
+    list_display = ('title', 'slug', 'posts_count')
+    search_fields = ('title', 'slug')
+
+
+@admin.register(Comment)
+class CommentAdmin(EstimatedCountAdmin):
+    list_display = ('pk', 'text', 'created', 'author', 'post')
+    list_select_related = ('author', 'post')
+    autocomplete_fields = ('author', 'post')
+    date_hierarchy = 'created'
     empty_value_display = EMPTY_VALUE
 
 
-admin.site.register(Group)
-admin.site.register(Comment)
-admin.site.register(Follow)
+@admin.register(Follow)
+class FollowAdmin(EstimatedCountAdmin):
+    list_display = ('user', 'author')
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
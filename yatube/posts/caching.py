@@ -0,0 +1,200 @@
+import hashlib
+import threading
+import uuid
+from collections import Counter
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from django.utils.translation import get_language
+
+from core import holes, metrics
+
+VERSION_PREFIX = 'pagecache:version:'
+PAGE_PREFIX = 'pagecache:page:'
+CARD_PREFIX = 'card:'
+# параметры запроса, от которых зависит страница
+PAGE_PARAMS = ('page', 'after', 'before')
+AUTHOR_FIELDS = ('username', 'first_name', 'last_name')
+CACHED_VIEWS = set()
+
+_stats_lock = threading.Lock()
+_stats = Counter()
+
+
+def _new_version():
+    # случайная, а не порядковая версия: после очистки счётчика
+    # старые страницы не могут случайно совпасть с новой версией
+    return uuid.uuid4().hex
+
+
+def _hot_lookup(key, model, **lookup):
+    """get_object_or_404 через двухуровневый кэш 'hot'."""
+    hot = caches['hot']
+    obj = hot.get(key)
+    if obj is None:
+        obj = get_object_or_404(model, **lookup)
+        hot.set(key, obj)
+    return obj
+
+
+def hot_group(slug):
+    from .models import Group
+    return _hot_lookup(f'group:{slug}', Group, slug=slug)
+
+
+def hot_author(username):
+    """Автор только с полями, которые видны на страницах: хеш пароля
+    и прочее не попадают в общий кэш. Сохранение такого объекта
+    затрагивает лишь загруженные поля.
+    """
+    from .models import User
+    return _hot_lookup(f'user:{username}', User.objects.only(*AUTHOR_FIELDS),
+                       username=username)
+
+
+def _now_and_on_commit(function):
+    """Сразу, чтобы изменения видела сама транзакция, и ещё раз после
+    коммита: параллельный запрос мог до коммита положить в кэш старые
+    данные уже под новой версией.
+    """
+    function()
+    transaction.on_commit(function)
+
+
+def forget(groups=(), authors=()):
+    keys = [f'group:{slug}' for slug in groups]
+    keys += [f'user:{username}' for username in authors]
+    if keys:
+        _now_and_on_commit(lambda: caches['hot'].delete_many(keys))
+
+
+def _card_key(post, template):
+    """Ключ карточки меняется вместе со всем, что в ней видно."""
+    group = post.group
+    author = post.author
+    content = '|'.join(map(str, [
+        template, get_language(), post.text, post.pub_date.isoformat(),
+        post.image.name, post.image_placeholder, post.comments_count,
+        post.group_id,
+        group.slug if group else '', author.username,
+        author.get_full_name(),
+    ]))
+    digest = hashlib.md5(content.encode()).hexdigest()
+    return f'{CARD_PREFIX}{post.pk}:{digest}'
+
+
+def post_cards(posts, template):
+    """HTML карточек постов: готовые берутся одним get_many,
+    недостающие рендерятся и кладутся обратно одним set_many.
+    """
+    hot = caches['hot']
+    keys = [_card_key(post, template) for post in posts]
+    cards = hot.get_many(keys)
+    missing = {}
+    for key, post in zip(keys, posts):
+        if key not in cards:
+            cards[key] = render_to_string(template, {'post': post})
+            # пока миниатюры нет, карточка временная
+            if not getattr(post, 'thumbnail_pending', False):
+                missing[key] = cards[key]
+    if missing:
+        hot.set_many(missing, settings.POST_CARD_TIMEOUT)
+    return [mark_safe(cards[key]) for key in keys]
+
+
+def _version_key(scope):
+    # в slug и username бывают символы, недопустимые в ключах memcached
+    return VERSION_PREFIX + hashlib.md5(scope.encode()).hexdigest()
+
+
+def get_versions(scopes):
+    keys = [_version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _new_version(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump(*scopes):
+    """Делает устаревшими все закэшированные страницы этих областей."""
+    keys = [_version_key(scope) for scope in scopes if scope]
+    if keys:
+        _now_and_on_commit(lambda: cache.set_many(
+            {key: _new_version() for key in keys}, None
+        ))
+
+
+def _count(view_name, result):
+    # в памяти процесса: запись в общий кэш на каждый хит стоила бы
+    # транзакции SQLite; сумму по процессам даёт /metrics
+    with _stats_lock:
+        _stats[view_name, result] += 1
+    metrics.inc('yatube_page_cache_requests_total', view=view_name,
+                result=result)
+
+
+def stats():
+    """Попадания и промахи страничного кэша этого процесса по view."""
+    with _stats_lock:
+        return {
+            name: {'hit': _stats[name, 'hit'], 'miss': _stats[name, 'miss']}
+            for name in sorted(CACHED_VIEWS)
+        }
+
+
+def _page_key(request, versions):
+    # прочие параметры (utm_*, fbclid...) страницу не меняют и
+    # не должны плодить её копии в кэше
+    params = [f'{name}={request.GET.get(name, "")}' for name in PAGE_PARAMS]
+    raw = '|'.join([request.path, *params, *versions])
+    return PAGE_PREFIX + hashlib.md5(raw.encode()).hexdigest()
+
+
+def cached_page(*scopes, timeout=None):
+    """Кэширует GET-ответ view под ключом из версий областей scopes.
+
+    Области задаются шаблонами от аргументов view, например
+    'group:{slug}'. Страница живёт долго, но устаревает сразу после
+    bump() любой из своих областей. В кэше лежит одна копия страницы
+    для всех пользователей: их фрагменты ({% hole %}) заполняются
+    на каждый запрос.
+    """
+    def decorator(view):
+        CACHED_VIEWS.add(view.__name__)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            versions = get_versions(
+                [scope.format(**kwargs) for scope in scopes]
+            )
+            key = _page_key(request, versions)
+            content = cache.get(key)
+            if content is not None:
+                _count(view.__name__, 'hit')
+                return HttpResponse(holes.fill(content, request))
+            _count(view.__name__, 'miss')
+            request.punch_holes = True
+            try:
+                response = view(request, *args, **kwargs)
+            finally:
+                request.punch_holes = False
+            if response.streaming:
+                return response
+            content = response.content.decode(response.charset)
+            if response.status_code == 200:
+                cache.set(key, content,
+                          timeout or settings.PAGE_CACHE_TIMEOUT)
+            response.content = holes.fill(content, request)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,101 @@
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Post, Group, Comment, Follow, User, UserCounters
+
+
+def _deltas(**deltas):
+    # счётчики беззнаковые: уменьшаем не ниже нуля
+    return {
+        field: F(field) + delta if delta > 0
+        else Greatest(F(field) + delta, Value(0))
+        for field, delta in deltas.items()
+    }
+
+
+def bump_group(group_id, delta):
+    if group_id:
+        Group.objects.filter(pk=group_id).update(
+            **_deltas(posts_count=delta)
+        )
+
+
+def bump_post(post_id, delta):
+    Post.objects.filter(pk=post_id).update(**_deltas(comments_count=delta))
+
+
+def bump_user(user_id, **deltas):
+    """Атомарно меняет счётчики пользователя на месте (UPDATE ... SET
+    x = x + d). Недостающую строку создаёт только при увеличении:
+    при удалении пользователя каскадом её создавать нельзя.
+    """
+    updated = UserCounters.objects.filter(user_id=user_id).update(
+        **_deltas(**deltas)
+    )
+    if not updated and all(delta > 0 for delta in deltas.values()):
+        UserCounters.objects.get_or_create(user_id=user_id)
+        UserCounters.objects.filter(user_id=user_id).update(
+            **_deltas(**deltas)
+        )
+
+
+def _count(model, field, outer='pk'):
+    """Подзапрос COUNT(*) по внешнему ключу field для UPDATE."""
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef(outer)})
+        .order_by().values(field)
+        .annotate(total=Count('pk')).values('total')
+    ), Value(0))
+
+
+def recount_users(user_ids):
+    UserCounters.objects.bulk_create(
+        (UserCounters(user_id=user_id) for user_id in user_ids),
+        ignore_conflicts=True,
+    )
+    UserCounters.objects.filter(user_id__in=user_ids).update(
+        posts_count=_count(Post, 'author', 'user_id'),
+        followers_count=_count(Follow, 'author', 'user_id'),
+        following_count=_count(Follow, 'user', 'user_id'),
+    )
+
+
+def recount_groups(group_ids):
+    Group.objects.filter(pk__in=group_ids).update(
+        posts_count=_count(Post, 'group'),
+    )
+
+
+def recount_posts(post_ids):
+    Post.objects.filter(pk__in=post_ids).update(
+        comments_count=_count(Comment, 'post'),
+    )
+
+
+RECOUNTERS = (
+    (User, recount_users),
+    (Group, recount_groups),
+    (Post, recount_posts),
+)
+
+
+def recount_all(batch_size=1000):
+    """Пересчитывает все счётчики пачками по batch_size записей, каждую
+    в своей транзакции. Отдаёт (модель, число записей) по моделям.
+    """
+    for model, recount in RECOUNTERS:
+        total = 0
+        last_pk = 0
+        while True:
+            ids = list(
+                model.objects.filter(pk__gt=last_pk).order_by('pk')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            with transaction.atomic():
+                recount(ids)
+            total += len(ids)
+            last_pk = ids[-1]
+        yield model, total
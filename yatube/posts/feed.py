@@ -0,0 +1,172 @@
+from django.conf import settings
+from django.db import connection
+from django.db.models import OuterRef, Q, Subquery
+
+from .models import Post, Follow, FeedItem, User, UserCounters
+from .utils import CursorPaginator
+
+# сколько записей ленты вставляется за один INSERT
+BATCH_SIZE = 500
+
+
+def is_celebrity(post):
+    """Посты автора не рассылаются, а подмешиваются при чтении.
+
+    Между FEED_DEMOTE_LIMIT и FEED_FANOUT_LIMIT подписчиков автор
+    остаётся в режиме своего прошлого поста: иначе подписки и отписки
+    у границы переключали бы режим туда и обратно.
+    """
+    followers = UserCounters.objects.filter(
+        user=post.author_id
+    ).values_list('followers_count', flat=True).first() or 0
+    if followers >= settings.FEED_FANOUT_LIMIT:
+        return True
+    if followers < settings.FEED_DEMOTE_LIMIT:
+        return False
+    previous = Post.objects.filter(author_id=post.author_id).exclude(
+        pk=post.pk
+    ).order_by('-pub_date', '-pk').values_list('fanned_out', flat=True)
+    return previous.first() is False
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if is_celebrity(post):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    FeedItem.objects.bulk_create(
+        (FeedItem(user_id=user_id, post=post, pub_date=post.pub_date)
+         for user_id in followers.iterator()),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    Post.objects.filter(pk=post.pk).update(fanned_out=True)
+    post.fanned_out = True
+    # новый пост вытесняет из каждой ленты не больше одной записи
+    overflow = FeedItem.objects.filter(user=OuterRef('user_id')).order_by(
+        '-pub_date', '-post_id'
+    ).values('pk')[settings.FEED_MAX_ITEMS:settings.FEED_MAX_ITEMS + 1]
+    FeedItem.objects.filter(pk__in=Follow.objects.filter(
+        author_id=post.author_id
+    ).annotate(overflow=Subquery(overflow)).values('overflow')).delete()
+
+
+def reassign(post):
+    """Пост сменил автора: убирает его из лент подписчиков прежнего
+    и раскладывает по лентам подписчиков нового.
+    """
+    FeedItem.objects.filter(post=post).delete()
+    Post.objects.filter(pk=post.pk).update(fanned_out=False)
+    post.fanned_out = False
+    fan_out(post)
+
+
+def backfill(user, author):
+    """Добавляет в ленту подписчика последние разосланные посты автора."""
+    posts = author.posts.filter(fanned_out=True).values_list(
+        'pk', 'pub_date'
+    )[:settings.FEED_MAX_ITEMS]
+    FeedItem.objects.bulk_create(
+        (FeedItem(user=user, post_id=pk, pub_date=pub_date)
+         for pk, pub_date in posts),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    trim(user)
+
+
+def remove_author(user, author):
+    """Убирает из ленты пользователя посты автора после отписки."""
+    FeedItem.objects.filter(user=user, post__author=author).delete()
+
+
+def trim(user):
+    """Обрезает ленту пользователя до FEED_MAX_ITEMS последних записей."""
+    items = FeedItem.objects.filter(user=user)
+    border = items.order_by('-pub_date', '-post_id').values_list(
+        'pub_date', 'post_id'
+    )[settings.FEED_MAX_ITEMS:settings.FEED_MAX_ITEMS + 1]
+    if not border:
+        return
+    pub_date, post_id = border[0]
+    items.filter(
+        Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, post_id__lte=post_id)
+    ).delete()
+
+
+def rebuild():
+    """Заново размечает разосланные посты и собирает все ленты: для
+    данных, вставленных в обход сигналов. Счётчики подписчиков в
+    UserCounters должны быть уже пересчитаны.
+    """
+    celebrities = User.objects.filter(
+        counters__followers_count__gte=settings.FEED_FANOUT_LIMIT
+    )
+    Post.objects.exclude(author__in=celebrities).update(fanned_out=True)
+    FeedItem.objects.all().delete()
+    post, follow, item = (connection.ops.quote_name(model._meta.db_table)
+                          for model in (Post, Follow, FeedItem))
+    # как backfill и trim для каждой подписки: не больше FEED_MAX_ITEMS
+    # последних постов автора и записей в ленте
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO {item} (user_id, post_id, pub_date)
+            SELECT user_id, id, pub_date FROM (
+                SELECT f.user_id, p.id, p.pub_date, ROW_NUMBER() OVER (
+                    PARTITION BY f.user_id ORDER BY p.pub_date DESC, p.id DESC
+                ) AS position
+                FROM {follow} f JOIN (
+                    SELECT id, author_id, pub_date, ROW_NUMBER() OVER (
+                        PARTITION BY author_id ORDER BY pub_date DESC, id DESC
+                    ) AS position
+                    FROM {post} WHERE fanned_out
+                ) p ON p.author_id = f.author_id AND p.position <= %s
+            ) feed WHERE position <= %s
+        """, [settings.FEED_MAX_ITEMS] * 2)
+
+
+class FeedPaginator(CursorPaginator):
+    """Лента подписок по ключу (pub_date, id поста): записи FeedItem
+    пользователя вперемешку с не разосланными постами авторов, на
+    которых он подписан. Каждая часть читается своим
+    запросом с LIMIT по своему индексу.
+    """
+    def __init__(self, user, per_page):
+        super().__init__(Post.objects.for_listing(), per_page)
+        self.user = user
+
+    def celebrity_posts(self):
+        # не только популярных: посты автора, потерявшего подписчиков,
+        # не рассылаются заново, чтобы отписка не писала в чужие ленты
+        authors = Follow.objects.filter(user=self.user).values('author_id')
+        return Post.objects.filter(fanned_out=False, author_id__in=authors)
+
+    def items(self, after=None, before=None):
+        """Записи ленты пользователя: пары (pub_date, id поста)."""
+        items = FeedItem.objects.filter(user=self.user)
+        return self._ordered(items, after, before, 'post_id').values_list(
+            'pub_date', 'post_id'
+        )
+
+    def merged(self, after=None, before=None, border=None):
+        """Не разосланные посты авторов из подписок, те же пары."""
+        merged = self.celebrity_posts()
+        if border:
+            merged = merged.filter(**{
+                'pub_date__lte' if before else 'pub_date__gte': border
+            })
+        return self._ordered(merged, after, before).values_list(
+            'pub_date', 'pk'
+        )
+
+    def _fetch(self, after, before, limit):
+        rows = list(self.items(after, before)[:limit])
+        # посты дальше последней записи ленты на страницу не попадут
+        border = rows[-1][0] if len(rows) == limit else None
+        rows += self.merged(after, before, border)[:limit]
+        rows.sort(reverse=not before)
+        pks = [pk for _, pk in rows[:limit]]
+        posts = self.object_list.in_bulk(pks)
+        return [posts[pk] for pk in pks if pk in posts]
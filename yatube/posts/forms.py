@@ -1,5 +1,7 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 from .models import Post, Comment
+from .uploads import TOO_LARGE, normalize
 
 
 class PostForm(forms.ModelForm):
@@ -17,6 +19,21 @@ class PostForm(forms.ModelForm):
             'image': 'изображение поста'
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # загрузку, оборванную ImageUploadHandler, ImageField сочтёт
+        # повреждённой; объясняем настоящую причину
+        if getattr(self.files.get('image'), 'rejected', False):
+            field = self.fields['image']
+            field.error_messages = {**field.error_messages,
+                                    'invalid_image': TOO_LARGE}
+
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            return normalize(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,19 @@
+from core.holes import fragment
+
+from .forms import CommentForm
+from .models import Follow
+
+
+@fragment('follow_button', 'includes/follow_button.html')
+def follow_button(request, author):
+    following = (
+        request.user.is_authenticated
+        and Follow.objects.filter(user=request.user,
+                                  author__username=author).exists()
+    )
+    return {'author': author, 'following': following}
+
+
+@fragment('comment_form', 'includes/comment_form.html')
+def comment_form(request, post_id):
+    return {'post_id': post_id, 'form': CommentForm()}
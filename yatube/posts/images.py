@@ -0,0 +1,217 @@
+"""Картинки постов нужного размера: ширина и формат из белого списка.
+
+Каждый вариант рендерится один раз и складывается на диск под именем
+из хэша содержимого исходника, поэтому одинаковые картинки разных
+постов делят варианты, а новая картинка получает новые адреса.
+"""
+import base64
+import fcntl
+import glob
+import hashlib
+import os
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import SuspiciousFileOperation
+from django.urls import reverse
+from PIL import Image, ImageOps
+from sorl import thumbnail
+from sorl.thumbnail.images import ImageFile
+
+DIGEST_PREFIX = 'image:digest:'
+CHUNK_SIZE = 64 * 1024
+PLACEHOLDER_WIDTH = 16
+# файлов блокировок рендера: варианты делят их по хэшу пути, поэтому
+# файлов столько и остаётся, сколько бы вариантов ни было
+LOCK_STRIPES = 64
+ENCODER_OPTIONS = {
+    'JPEG': {'optimize': True, 'progressive': True},
+    'PNG': {'optimize': True},
+    # WebP: самое медленное и самое плотное сжатие, рендер всё равно
+    # происходит один раз
+    'WEBP': {'method': 6},
+}
+
+
+def version(image):
+    """Короткая метка картинки для URL: меняется вместе с файлом."""
+    return hashlib.md5(image.name.encode()).hexdigest()[:12]
+
+
+def digest(image):
+    """sha256 содержимого файла; считается один раз на файл."""
+    if getattr(image.storage, 'content_addressed', False):
+        value = image.storage.digest(image.name)
+        if value:
+            return value
+    hot = caches['hot']
+    key = DIGEST_PREFIX + version(image)
+    value = hot.get(key)
+    if value is None:
+        sha = hashlib.sha256()
+        with image.storage.open(image.name, 'rb') as source:
+            for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+                sha.update(chunk)
+        value = sha.hexdigest()
+        hot.set(key, value, None)
+    return value
+
+
+def variant_size(geometry, width):
+    size, _ = settings.THUMBNAIL_GEOMETRIES[geometry]
+    base_width, base_height = map(int, size.split('x'))
+    return width, round(width * base_height / base_width)
+
+
+def variant_url(post, geometry, width, fmt):
+    return reverse('posts:post_image', kwargs={
+        'post_id': post.pk,
+        'version': version(post.image),
+        'geometry': geometry,
+        'width': width,
+        'fmt': fmt,
+    })
+
+
+def srcset(post, geometry, fmt):
+    return ', '.join(
+        f'{variant_url(post, geometry, width, fmt)} {width}w'
+        for width in settings.IMAGE_VARIANT_WIDTHS
+    )
+
+
+def formats():
+    """Форматы из IMAGE_VARIANT_FORMATS, которые умеет сохранять
+    установленный Pillow (WebP есть не в каждой сборке).
+    """
+    Image.init()
+    return {fmt: image_format
+            for fmt, image_format in settings.IMAGE_VARIANT_FORMATS.items()
+            if image_format in Image.SAVE}
+
+
+def fit(source, size):
+    """Обрезает картинку (файл или уже открытую) по центру до size."""
+    if isinstance(source, Image.Image):
+        return ImageOps.fit(ImageOps.exif_transpose(source), size,
+                            Image.LANCZOS)
+    with Image.open(source) as original:
+        return fit(original, size)
+
+
+def encode(picture, target, image_format):
+    if image_format == 'JPEG' and picture.mode != 'RGB':
+        picture = picture.convert('RGB')
+    picture.save(target, image_format,
+                 quality=settings.IMAGE_VARIANT_QUALITY,
+                 **ENCODER_OPTIONS.get(image_format, {}))
+
+
+def render(image, path, size, fmt):
+    """Обрезает по центру до size и сохраняет в path атомарно."""
+    with image.storage.open(image.name, 'rb') as source:
+        picture = fit(source, size)
+    descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(descriptor, 'wb') as target:
+            encode(picture, target, settings.IMAGE_VARIANT_FORMATS[fmt])
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def variant(image, geometry, width, fmt):
+    """Путь к готовому варианту картинки; рендерит его при первом
+    обращении. Параллельные запросы одного варианта ждут друг друга
+    на блокировке файла, а не рендерят его по нескольку раз.
+    """
+    name = digest(image)
+    directory = variants_path(name)
+    path = os.path.join(directory, f'{name}-{geometry}-{width}.{fmt}')
+    if os.path.exists(path):
+        return path
+    os.makedirs(directory, exist_ok=True)
+    with open(lock_path(path), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            if not os.path.exists(path):
+                render(image, path, variant_size(geometry, width), fmt)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+    return path
+
+
+def _preview(source):
+    with Image.open(source) as original:
+        # JPEG сразу декодируется в уменьшенном масштабе
+        original.draft('RGB', (PLACEHOLDER_WIDTH * 4,) * 2)
+        return fit(original, variant_size('card', PLACEHOLDER_WIDTH))
+
+
+def placeholder(image):
+    """Превью картинки для Post.image_placeholder: картинка шириной
+    PLACEHOLDER_WIDTH с пропорциями миниатюры 'card' в виде data: URI
+    в пару сотен байт. Картинка может быть ещё не сохранённой загрузкой.
+    """
+    try:
+        if getattr(image, '_committed', True):
+            with image.storage.open(image.name, 'rb') as source:
+                picture = _preview(source)
+        else:
+            image.file.seek(0)
+            picture = _preview(image.file)
+            image.file.seek(0)
+    except (OSError, SuspiciousFileOperation):
+        return ''
+    buffer = BytesIO()
+    picture.convert('RGB').save(buffer, 'PNG', optimize=True)
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/png;base64,{encoded}'
+
+
+def variants_path(name):
+    return os.path.join(settings.MEDIA_ROOT, 'variants', name[:2])
+
+
+def lock_path(path):
+    """Файл блокировки для рендера варианта path, общий для группы."""
+    directory = os.path.join(settings.MEDIA_ROOT, 'variants', 'locks')
+    os.makedirs(directory, exist_ok=True)
+    stripe = int(hashlib.md5(path.encode()).hexdigest(), 16) % LOCK_STRIPES
+    return os.path.join(directory, f'{stripe}.lock')
+
+
+def release(name):
+    """Удаляет картинку, её миниатюры и варианты, если на неё больше
+    не ссылается ни один пост.
+    """
+    from .models import Post
+    storage = Post.image.field.storage
+    if Post.objects.filter(image=name).exists():
+        return False
+    try:
+        storage.path(name)
+    except SuspiciousFileOperation:
+        # путь вне MEDIA_ROOT: файл не наш, не трогаем
+        return False
+    if storage.recently_saved(name, settings.IMAGE_RELEASE_GRACE):
+        # файл только что загрузили снова; его подберёт сборщик мусора
+        return False
+    thumbnail.delete(ImageFile(name, storage))
+    delete_variants(storage.digest(name))
+    return True
+
+
+def delete_variants(content_digest):
+    """Удаляет варианты картинки и возвращает, сколько байт освобождено."""
+    freed = 0
+    if not content_digest:
+        return freed
+    for path in glob.glob(os.path.join(variants_path(content_digest),
+                                       content_digest + '-*')):
+        freed += os.path.getsize(path)
+        os.unlink(path)
+    return freed
@@ -0,0 +1,38 @@
+"""Запросы лент ровно в том виде, в каком их выполняют страницы:
+по ним тесты проверяют планы, а index_benchmark замеряет время.
+"""
+from django.conf import settings
+
+from .feed import FeedPaginator
+from .models import Comment, Follow, Post
+from .utils import CursorPaginator
+
+
+def listings(group, author, post, user, after=None, before=None):
+    """Страница каждой ленты: первая, за курсором after или перед
+    курсором before (пары (дата, id), как у CursorPaginator).
+    """
+    per_page = settings.POSTS_PER_PAGE
+    paginators = {
+        'index': CursorPaginator(Post.objects.for_listing(), per_page),
+        'group': CursorPaginator(group.posts.for_listing(), per_page),
+        'profile': CursorPaginator(author.posts.for_listing(), per_page),
+        'comments': CursorPaginator(
+            Comment.objects.filter(post_id=post.pk).select_related('author'),
+            settings.COMMENTS_PER_PAGE, field='created',
+        ),
+    }
+    queries = {
+        name: paginator._ordered(paginator.object_list, after, before)[
+            :paginator.per_page + 1
+        ]
+        for name, paginator in paginators.items()
+    }
+    feed = FeedPaginator(user, per_page)
+    queries['follow'] = feed.items(after, before)[:per_page + 1]
+    queries['follow_merged'] = feed.merged(after, before)[:per_page + 1]
+    # подписчики автора, по лентам которых рассылается его пост
+    queries['followers'] = Follow.objects.filter(
+        author_id=author.pk
+    ).values_list('user_id', flat=True)
+    return queries
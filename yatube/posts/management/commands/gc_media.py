@@ -0,0 +1,178 @@
+import os
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.helpers import deserialize
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore
+
+from posts import images
+from posts.models import Post
+
+
+def walk(root):
+    """Файлы под root (os.DirEntry) без построения полного списка."""
+    try:
+        entries = os.scandir(root)
+    except FileNotFoundError:
+        return
+    with entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from walk(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                yield entry
+
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def kv_rows(identity, batch_size):
+    """Записи хранилища sorl с данным префиксом, пачками по ключу."""
+    prefix = add_prefix('', identity)
+    last = prefix
+    while True:
+        rows = list(
+            KVStore.objects.filter(key__startswith=prefix, key__gt=last)
+            .order_by('key').values_list('key', 'value')[:batch_size]
+        )
+        if not rows:
+            return
+        yield rows
+        last = rows[-1][0]
+
+
+def referenced(names):
+    return set(
+        Post.objects.filter(image__in=names).values_list('image', flat=True)
+    )
+
+
+class Command(BaseCommand):
+    help = ('Удаляет картинки постов, миниатюры sorl и их записи в '
+            'хранилище, на которые больше ничего не ссылается. '
+            'С --dry-run только показывает, что было бы удалено')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--min-age', type=int, default=settings.IMAGE_RELEASE_GRACE,
+            help='не трогать файлы моложе стольких секунд',
+        )
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.batch_size = options['batch_size']
+        self.verbosity = options['verbosity']
+        self.deadline = time.time() - options['min_age']
+        self.storage = Post.image.field.storage
+        self.report('миниатюры удалённых картинок', *self.gc_sources())
+        self.report('картинки постов', *self.gc_originals())
+        self.report('миниатюры без записей', *self.gc_thumbnails())
+
+    def report(self, title, count, freed):
+        verb = 'будет удалено' if self.dry_run else 'удалено'
+        self.stdout.write(f'{title}: {verb} {count}, {freed} байт')
+
+    def remove(self, storage, name):
+        """Удаляет файл и возвращает его размер."""
+        try:
+            size = storage.size(name)
+        except OSError:
+            return 0
+        if self.verbosity > 1:
+            self.stdout.write(f'  {name}')
+        if not self.dry_run:
+            storage.delete(name)
+        return size
+
+    def gc_sources(self):
+        """Записи sorl об исходниках, на которые не ссылается ни один
+        пост: удаляются их миниатюры и все связанные записи.
+        """
+        count = freed = 0
+        for rows in kv_rows('thumbnails', self.batch_size):
+            sources = dict(KVStore.objects.filter(
+                key__in=[add_prefix(key.split('||')[-1])
+                         for key, _ in rows]
+            ).values_list('key', 'value'))
+            names = {}
+            for key, value in rows:
+                source_key = key.split('||')[-1]
+                image = sources.get(add_prefix(source_key))
+                if image is not None:
+                    names[source_key] = deserialize_image_file(image).name
+            alive = referenced(list(names.values()))
+            for key, value in rows:
+                source_key = key.split('||')[-1]
+                if names.get(source_key) in alive:
+                    continue
+                count += 1
+                freed += self.drop_thumbnails(source_key, deserialize(value))
+        return count, freed
+
+    def drop_thumbnails(self, source_key, thumbnail_keys):
+        freed = 0
+        raw_keys = [add_prefix(source_key, 'thumbnails'),
+                    add_prefix(source_key)]
+        for key in thumbnail_keys:
+            raw_keys.append(add_prefix(key))
+            thumbnail = default.kvstore._get(key)
+            if thumbnail is not None:
+                freed += self.remove(thumbnail.storage, thumbnail.name)
+        if not self.dry_run:
+            default.kvstore._delete_raw(*raw_keys)
+        return freed
+
+    def gc_originals(self):
+        count = freed = 0
+        root = os.path.join(settings.MEDIA_ROOT, 'posts')
+        for entries in chunks(walk(root), self.batch_size):
+            names = {
+                os.path.relpath(entry.path, settings.MEDIA_ROOT)
+                .replace(os.sep, '/'): entry
+                for entry in entries
+                if entry.stat().st_mtime < self.deadline
+            }
+            alive = referenced(list(names))
+            for name in names.keys() - alive:
+                count += 1
+                freed += self.remove(self.storage, name)
+                if not self.dry_run:
+                    freed += images.delete_variants(
+                        self.storage.digest(name)
+                    )
+        return count, freed
+
+    def gc_thumbnails(self):
+        """Файлы миниатюр, о которых не знает хранилище sorl."""
+        count = freed = 0
+        root = os.path.join(settings.MEDIA_ROOT,
+                            sorl_settings.THUMBNAIL_PREFIX)
+        for entries in chunks(walk(root), self.batch_size):
+            keys = {}
+            for entry in entries:
+                if entry.stat().st_mtime >= self.deadline:
+                    continue
+                name = os.path.relpath(entry.path, settings.MEDIA_ROOT)
+                name = name.replace(os.sep, '/')
+                keys[add_prefix(ImageFile(name, default.storage).key)] = name
+            known = set(KVStore.objects.filter(
+                key__in=list(keys)
+            ).values_list('key', flat=True))
+            for key in keys.keys() - known:
+                count += 1
+                freed += self.remove(default.storage, keys[key])
+        return count, freed
@@ -0,0 +1,76 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import images
+
+
+def encoded_size(picture, image_format):
+    buffer = BytesIO()
+    images.encode(picture, buffer, image_format)
+    return buffer.tell()
+
+
+class Command(BaseCommand):
+    help = ('Считает, сколько байт экономят миниатюры JPEG и WebP '
+            'по сравнению с исходными картинками в media/posts/')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--width', type=int,
+                            default=max(settings.IMAGE_VARIANT_WIDTHS))
+        parser.add_argument('--limit', type=int, default=None,
+                            help='проверить не больше стольких файлов')
+
+    def handle(self, *args, **options):
+        available = images.formats()
+        targets = [fmt for fmt in ('jpg', 'webp') if fmt in available]
+        if 'webp' not in available:
+            self.stderr.write('Pillow собран без WebP, считаем только JPEG')
+        totals = dict.fromkeys(['original', *targets], 0)
+        files = skipped = 0
+        for path in self.sources(options['limit']):
+            try:
+                sizes = self.measure(path, options['width'], available,
+                                     targets)
+            except OSError as error:
+                skipped += 1
+                self.stderr.write(f'{path}: {error}')
+                continue
+            files += 1
+            for name, size in sizes.items():
+                totals[name] += size
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{path}: ' + ', '.join(
+                    f'{name} {size}' for name, size in sizes.items()
+                ))
+        self.stdout.write(f'файлов: {files}, пропущено: {skipped}')
+        original = totals['original'] or 1
+        for name, size in totals.items():
+            self.stdout.write(
+                f'{name:<9}{size:>14} байт  {size / original:>7.1%}'
+            )
+
+    def sources(self, limit):
+        root = os.path.join(settings.MEDIA_ROOT, 'posts')
+        count = 0
+        for directory, _, names in os.walk(root):
+            for name in sorted(names):
+                if limit is not None and count >= limit:
+                    return
+                count += 1
+                yield os.path.join(directory, name)
+
+    def measure(self, path, width, available, targets):
+        sizes = {'original': os.path.getsize(path)}
+        for geometry in settings.THUMBNAIL_GEOMETRIES:
+            with open(path, 'rb') as source:
+                picture = images.fit(
+                    source, images.variant_size(geometry, width)
+                )
+            for fmt in targets:
+                sizes[fmt] = sizes.get(fmt, 0) + encoded_size(
+                    picture, available[fmt]
+                )
+        return sizes
@@ -0,0 +1,78 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+
+from posts import seeding
+from posts.listings import listings
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+def busiest(model, related):
+    return (model.objects.annotate(total=Count(related))
+            .order_by('-total').first())
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает время запросов лент с составными индексами из '
+            'Meta.indexes и без них. Индексы удаляются в транзакции, '
+            'которая затем откатывается; --posts N сперва добавляет '
+            'N постов с комментариями и подписками (тоже с откатом)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=0)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.repeat = options['repeat']
+        with transaction.atomic():
+            if options['posts']:
+                posts = options['posts']
+                seeding.seed(users=max(posts // 100, 2), posts=posts,
+                             comments=posts, follows=posts // 5,
+                             seed=options['seed'])
+                self.stdout.write(f'добавлено постов: {posts}')
+            queries = self.queries()
+            before = self.measure(queries)
+            self.drop_indexes()
+            after = self.measure(queries)
+            transaction.set_rollback(True)
+        self.stdout.write(f'{"запрос":<16}{"с индексами, мс":>18}'
+                          f'{"без индексов, мс":>20}')
+        for name in queries:
+            self.stdout.write(f'{name:<16}{before[name] * 1000:>18.2f}'
+                              f'{after[name] * 1000:>20.2f}')
+
+    def queries(self):
+        found = (busiest(Group, 'posts'), busiest(User, 'posts'),
+                 busiest(Post, 'comments'), busiest(User, 'follower'))
+        if None in found:
+            raise CommandError('В базе нет данных, добавьте их: --posts N')
+        return listings(*found)
+
+    def measure(self, queries):
+        result = {}
+        for name, queryset in queries.items():
+            timings = []
+            for _ in range(self.repeat):
+                started = time.perf_counter()
+                # all() — новый запрос без кэша результатов
+                list(queryset.all())
+                timings.append(time.perf_counter() - started)
+            result[name] = statistics.median(timings)
+        return result
+
+    def drop_indexes(self):
+        # редактор схемы только строит SQL: в SQLite войти в него внутри
+        # транзакции нельзя, а DROP INDEX откатывается и так
+        editor = connection.schema_editor()
+        with connection.cursor() as cursor:
+            for model in (Post, Comment, Follow):
+                for index in model._meta.indexes:
+                    cursor.execute(str(index.remove_sql(model, editor)))
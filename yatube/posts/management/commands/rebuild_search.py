@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = ('Пересоздаёт поисковый индекс posts_post_fts, например после '
+            'загрузки дампа или правок через QuerySet.update()')
+
+    def handle(self, *args, **options):
+        if not search.enabled():
+            raise CommandError('Индекс FTS5 есть только в SQLite')
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute('DROP TABLE IF EXISTS posts_post_fts')
+            cursor.execute(search.CREATE_TABLE)
+            search.rebuild()
+            cursor.execute('SELECT count(*) FROM posts_post_fts')
+            count = cursor.fetchone()[0]
+        with connection.cursor() as cursor:
+            # сливает сегменты индекса в один
+            cursor.execute("INSERT INTO posts_post_fts (posts_post_fts) "
+                           "VALUES ('optimize')")
+        self.stdout.write(f'в индексе {count} постов')
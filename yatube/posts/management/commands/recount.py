@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import recount_all
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает денормализованные счётчики постов, комментариев '
+            'и подписок пачками по --batch-size записей')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        for model, total in recount_all(options['batch_size']):
+            self.stdout.write(f'{model._meta.verbose_name_plural}: {total}')
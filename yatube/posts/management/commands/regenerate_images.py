@@ -0,0 +1,134 @@
+import json
+import multiprocessing
+import os
+import time
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from sorl.thumbnail.images import ImageFile
+
+from posts import caching, images, thumbnails
+from posts.models import Post
+
+
+def init_worker(nice):
+    # при spawn процесс-работник начинает с чистого интерпретатора
+    django.setup()
+    if nice:
+        os.nice(nice)
+
+
+def regenerate(task):
+    name, force = task
+    image = ImageFile(name, Post.image.field.storage)
+    try:
+        thumbnails.regenerate(image, force)
+    except Exception as error:
+        return name, f'{type(error).__name__}: {error}', None
+    return name, None, images.placeholder(image)
+
+
+class Command(BaseCommand):
+    help = ('Заново создаёт миниатюры, варианты и превью всех картинок '
+            'постов в пуле процессов; продолжает с места остановки')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int,
+                            default=os.cpu_count(),
+                            help='0 — без пула, в этом процессе')
+        parser.add_argument('--chunk-size', type=int, default=200)
+        parser.add_argument('--max-rate', type=float, default=None,
+                            help='не больше стольких постов в секунду')
+        parser.add_argument('--nice', type=int, default=10,
+                            help='приоритет процессов-работников')
+        parser.add_argument('--force', action='store_true',
+                            help='пересоздать и уже готовые миниатюры')
+        parser.add_argument(
+            '--checkpoint',
+            default=os.path.join(settings.BASE_DIR, '.regenerate_images'),
+        )
+        parser.add_argument('--restart', action='store_true',
+                            help='начать с начала, забыв контрольную точку')
+
+    def handle(self, *args, **options):
+        self.checkpoint = options['checkpoint']
+        state = {'last_id': 0, 'done': 0, 'failed': 0}
+        if not options['restart'] and os.path.exists(self.checkpoint):
+            with open(self.checkpoint) as checkpoint:
+                state.update(json.load(checkpoint))
+            self.stdout.write(f'продолжаем после поста {state["last_id"]}')
+        posts = Post.objects.exclude(image='').order_by('pk')
+        total = posts.filter(pk__gt=state['last_id']).count()
+        pool = None
+        if options['processes']:
+            # соединения с базой не должны достаться процессам по fork
+            connections.close_all()
+            pool = multiprocessing.Pool(options['processes'], init_worker,
+                                        (options['nice'],))
+        try:
+            self.run(posts, total, state, pool, options)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+    def run(self, posts, total, state, pool, options):
+        started = time.monotonic()
+        processed = 0
+        rate = options['max_rate']
+        while True:
+            chunk = list(
+                posts.filter(pk__gt=state['last_id'])
+                .values_list('pk', 'image')[:options['chunk_size']]
+            )
+            if not chunk:
+                break
+            # одинаковые картинки разных постов — один файл
+            tasks = [(name, options['force'])
+                     for name in sorted({name for _, name in chunk})]
+            results = (pool.imap_unordered(regenerate, tasks) if pool
+                       else map(regenerate, tasks))
+            scopes = set()
+            for name, error, placeholder in results:
+                if error:
+                    state['failed'] += 1
+                    self.stderr.write(f'{name}: {error}')
+                    continue
+                state['done'] += 1
+                changed = Post.objects.filter(image=name).exclude(
+                    image_placeholder=placeholder,
+                )
+                # update() идёт мимо сигналов: области страничного кэша,
+                # как в signals.post_scopes, сбрасываются здесь
+                for pk, username, slug in changed.values_list(
+                    'pk', 'author__username', 'group__slug'
+                ):
+                    scopes.update(['index', f'post:{pk}',
+                                   f'profile:{username}',
+                                   slug and f'group:{slug}'])
+                changed.update(image_placeholder=placeholder)
+            caching.bump(*scopes)
+            processed += len(chunk)
+            state['last_id'] = chunk[-1][0]
+            self.save_checkpoint(state)
+            elapsed = time.monotonic() - started
+            if rate and processed / rate > elapsed:
+                time.sleep(processed / rate - elapsed)
+                elapsed = time.monotonic() - started
+            speed = processed / elapsed if elapsed else 0
+            left = (total - processed) / speed if speed else 0
+            self.stdout.write(
+                f'{processed}/{total} постов, {speed:.1f} в секунду, '
+                f'осталось ~{left:.0f} с'
+            )
+        self.stdout.write(
+            f'готово: картинок {state["done"]}, ошибок {state["failed"]}'
+        )
+
+    def save_checkpoint(self, state):
+        temporary = self.checkpoint + '.tmp'
+        with open(temporary, 'w') as checkpoint:
+            json.dump(state, checkpoint)
+        os.replace(temporary, self.checkpoint)
@@ -0,0 +1,78 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from posts import search, seeding
+
+
+def timed(function, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+class Command(BaseCommand):
+    help = ('Замеряет поиск, как его выполняет страница posts:search '
+            '(MATCH по posts_post_fts, сортировка по bm25, snippet, '
+            'LIMIT), и запасной LIKE на сгенерированных постах. Данные '
+            'создаются в транзакции, которая затем откатывается')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--existing', action='store_true',
+                            help='не создавать данные, взять те, что есть')
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        if not search.enabled():
+            raise CommandError('Индекс FTS5 есть только в SQLite')
+        with transaction.atomic():
+            if not options['existing']:
+                started = time.perf_counter()
+                seeding.seed(users=options['users'], posts=options['posts'],
+                             comments=0, follows=0, seed=options['seed'],
+                             deferred=True)
+                self.stdout.write(f'{options["posts"]} постов и индекс за '
+                                  f'{time.perf_counter() - started:.1f} с')
+            self.run(options['repeat'])
+            transaction.set_rollback(True)
+
+    def words(self):
+        """Частое, среднее и редкое слово из самого индекса."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE VIRTUAL TABLE temp.posts_post_fts_vocab '
+                'USING fts5vocab(main, posts_post_fts, row)'
+            )
+            cursor.execute('SELECT term, doc FROM temp.posts_post_fts_vocab '
+                           'ORDER BY doc DESC, term')
+            terms = cursor.fetchall()
+            cursor.execute('DROP TABLE temp.posts_post_fts_vocab')
+        if not terms:
+            raise CommandError('Поисковый индекс пуст')
+        return [terms[0], terms[len(terms) // 100], terms[-1]]
+
+    def run(self, repeat):
+        self.stdout.write(f'{"слово":<16}{"постов":>9}{"FTS5, мс":>11}'
+                          f'{"стр. 2, мс":>12}{"LIKE, мс":>11}')
+        for word, documents in self.words():
+            fts, (_, cursor) = timed(lambda: search.search(word), repeat)
+            second = 0
+            if cursor:
+                second, _ = timed(
+                    lambda: search.search(word, after=cursor), repeat
+                )
+            # запасной путь для баз без FTS5, тот же размер страницы
+            like, _ = timed(lambda: search._like_rows(
+                word, None, settings.POSTS_PER_PAGE + 1
+            ), repeat)
+            self.stdout.write(f'{word:<16}{documents:>9}{fts * 1000:>11.1f}'
+                              f'{second * 1000:>12.1f}{like * 1000:>11.1f}')
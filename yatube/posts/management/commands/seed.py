@@ -0,0 +1,95 @@
+import multiprocessing
+import time
+from datetime import date, datetime
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.utils import timezone
+
+from posts import seeding
+from posts.models import Comment, FeedItem, Follow, Post
+
+
+def end_date(value):
+    """Значение --end: полночь по UTC в начале этой даты."""
+    return datetime.combine(date.fromisoformat(value), datetime.min.time(),
+                            tzinfo=timezone.utc)
+
+
+def init_worker():
+    # при spawn процесс-работник начинает с чистого интерпретатора
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = ('Быстро заполняет базу сгенерированными пользователями, '
+            'группами, постами, комментариями и подписками. Один и тот '
+            'же --seed с тем же --end даёт одни и те же данные')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument('--comments', type=int, default=2000000)
+        parser.add_argument('--follows', type=int, default=200000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--days', type=int, default=365,
+                            help='за сколько дней до --end идут посты')
+        parser.add_argument('--end', type=end_date, default=None,
+                            help='дата ГГГГ-ММ-ДД, которой заканчиваются '
+                                 'посты; по умолчанию '
+                                 f'{seeding.END:%Y-%m-%d}')
+        parser.add_argument('--transaction-size', type=int,
+                            default=seeding.TRANSACTION_SIZE,
+                            help='строк в одной транзакции')
+        parser.add_argument('--keep-indexes', action='store_true',
+                            help='не снимать индексы на время загрузки')
+        parser.add_argument('--images', type=int, default=0,
+                            help='сколько разных картинок-заглушек создать')
+        parser.add_argument('--image-share', type=float, default=0.3,
+                            help='доля постов с картинкой')
+        parser.add_argument('--processes', type=int, default=None,
+                            help='процессов для картинок, по умолчанию '
+                                 'по числу ядер')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        pictures = self.pictures(options)
+        if (connection.vendor == 'sqlite'
+                and not connection.in_atomic_block):
+            # стенд можно пересоздать: надёжность записи не нужна
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA synchronous = OFF')
+        models = () if options['keep_indexes'] else (
+            Post, Comment, Follow, FeedItem,
+        )
+        with seeding.deferred_indexes(*models):
+            counts = seeding.seed(
+                users=options['users'], groups=options['groups'],
+                posts=options['posts'], comments=options['comments'],
+                follows=options['follows'], seed=options['seed'],
+                days=options['days'], end=options['end'],
+                pictures=pictures,
+                image_share=options['image_share'],
+                transaction_size=options['transaction_size'],
+                deferred=True,
+            )
+        seeding.finish()
+        created = ', '.join(f'{name} {count}'
+                            for name, count in counts.items())
+        self.stdout.write(f'создано: {created} '
+                          f'за {time.monotonic() - started:.1f} с')
+
+    def pictures(self, options):
+        tasks = [(options['seed'], index)
+                 for index in range(options['images'])]
+        if not tasks:
+            return []
+        # соединения с базой не должны достаться процессам по fork
+        connections.close_all()
+        with multiprocessing.Pool(options['processes'],
+                                  init_worker) as pool:
+            pictures = pool.map(seeding.placeholder, tasks)
+        self.stdout.write(f'картинок: {len(pictures)}')
+        return pictures
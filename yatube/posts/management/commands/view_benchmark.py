@@ -0,0 +1,228 @@
+import json
+import platform
+import random
+import statistics
+import time
+import tracemalloc
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import seeding
+from posts.models import Follow, Group, Post
+
+User = get_user_model()
+VIEWS = ('index', 'group_posts', 'profile', 'post_detail', 'follow_index',
+         'post_create', 'add_comment')
+# сколько разных пользователей делают запросы
+CLIENTS = 20
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    position = (len(values) - 1) * percent / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (
+        position - lower
+    )
+
+
+def summary(timings, queries, allocated):
+    return {
+        'requests': len(timings),
+        'p50_ms': round(percentile(timings, 50) * 1000, 3),
+        'p95_ms': round(percentile(timings, 95) * 1000, 3),
+        'p99_ms': round(percentile(timings, 99) * 1000, 3),
+        'mean_ms': round(statistics.mean(timings) * 1000, 3),
+        'queries': statistics.median(queries),
+        'queries_max': max(queries),
+        'allocated_bytes': int(statistics.median(allocated)),
+    }
+
+
+class Command(BaseCommand):
+    help = ('Замеряет задержку (p50/p95/p99), число запросов к базе и '
+            'выделенную память для основных страниц на сгенерированных '
+            'данных и пишет результат в JSON. Данные создаются в '
+            'транзакции, которая затем откатывается; кэши подменяются '
+            'на локальные, чтобы не засорить общий')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument('--follows', type=int, default=20000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--existing', action='store_true',
+                            help='не создавать данные, взять те, что есть')
+        parser.add_argument('--requests', type=int, default=200,
+                            help='замеров на страницу')
+        parser.add_argument('--traced', type=int, default=20,
+                            help='замеров памяти на страницу')
+        parser.add_argument('--cold', action='store_true',
+                            help='очищать кэши перед каждым запросом')
+        parser.add_argument('--views', nargs='+', choices=VIEWS,
+                            default=VIEWS)
+        parser.add_argument('--output', default='view_benchmark.json')
+        parser.add_argument('--compare', default=None,
+                            help='JSON прошлого запуска для сравнения')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        dataset = {'seed': options['seed'], 'existing': options['existing']}
+        # многоуровневые кэши (LOCATION — другой алиас) оставляем как
+        # есть, под ними подменяется хранилище
+        caches_settings = {
+            alias: config if config.get('LOCATION') in settings.CACHES
+            else {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                  'LOCATION': f'bench-{alias}'}
+            for alias, config in settings.CACHES.items()
+        }
+        with override_settings(
+            CACHES=caches_settings,
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+        ), transaction.atomic():
+            if not options['existing']:
+                started = time.perf_counter()
+                dataset.update(seeding.seed(
+                    users=options['users'], groups=options['groups'],
+                    posts=options['posts'], comments=options['comments'],
+                    follows=options['follows'], seed=options['seed'],
+                ))
+                self.stdout.write(f'данные созданы за '
+                                  f'{time.perf_counter() - started:.1f} с')
+            results = self.run()
+            transaction.set_rollback(True)
+        report = {
+            'created': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'dataset': dataset,
+            'cold': options['cold'],
+            'views': results,
+        }
+        with open(options['output'], 'w') as output:
+            json.dump(report, output, ensure_ascii=False, indent=2)
+        self.print_report(results)
+        self.stdout.write(f'результат записан в {options["output"]}')
+
+    def run(self):
+        self.targets()
+        results = {}
+        for name in self.options['views']:
+            request = getattr(self, f'request_{name}')
+            # прогрев: шаблоны, соединение, кэш классов
+            for _ in range(3):
+                self.measure(request)
+            timings, queries = [], []
+            for _ in range(self.options['requests']):
+                elapsed, count = self.measure(request)
+                timings.append(elapsed)
+                queries.append(count)
+            allocated = [self.traced(request)
+                         for _ in range(max(self.options['traced'], 1))]
+            results[name] = summary(timings, queries, allocated)
+        return results
+
+    def targets(self):
+        posts = Post.objects.order_by('-pk').values_list('pk', flat=True)
+        self.posts = list(posts[:1000])
+        self.groups = list(Group.objects.values_list('slug', flat=True)[:100])
+        self.authors = list(User.objects.filter(
+            counters__posts_count__gt=0
+        ).values_list('username', flat=True)[:1000])
+        followers = User.objects.filter(
+            pk__in=Follow.objects.values('user')
+        ).order_by('pk')[:CLIENTS]
+        self.clients = []
+        for user in followers:
+            client = Client()
+            client.force_login(user)
+            self.clients.append(client)
+        if not (self.posts and self.groups and self.clients):
+            raise CommandError('Нужны посты, группы и подписки')
+
+    def measure(self, request):
+        if self.options['cold']:
+            for cache in caches.all():
+                cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = request()
+            elapsed = time.perf_counter() - started
+        if response.status_code not in (200, 302):
+            raise CommandError(f'{response.status_code} на '
+                               f'{response.wsgi_request.path}')
+        return elapsed, len(queries)
+
+    def traced(self, request):
+        """Пик памяти, выделенной за время запроса."""
+        tracemalloc.start()
+        try:
+            request()
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def client(self):
+        return self.rng.choice(self.clients)
+
+    def request_index(self):
+        return self.client().get(reverse('posts:index'))
+
+    def request_group_posts(self):
+        return self.client().get(reverse(
+            'posts:group_list', args=(self.rng.choice(self.groups),)
+        ))
+
+    def request_profile(self):
+        return self.client().get(reverse(
+            'posts:profile', args=(self.rng.choice(self.authors),)
+        ))
+
+    def request_post_detail(self):
+        return self.client().get(reverse(
+            'posts:post_detail', args=(self.rng.choice(self.posts),)
+        ))
+
+    def request_follow_index(self):
+        return self.client().get(reverse('posts:follow_index'))
+
+    def request_post_create(self):
+        return self.client().post(reverse('posts:post_create'), {
+            'text': f'Пост {self.rng.random()}',
+        })
+
+    def request_add_comment(self):
+        return self.client().post(reverse(
+            'posts:add_comment', args=(self.rng.choice(self.posts),)
+        ), {'text': f'Комментарий {self.rng.random()}'})
+
+    def print_report(self, results):
+        previous = {}
+        if self.options['compare']:
+            with open(self.options['compare']) as compare:
+                previous = json.load(compare)['views']
+        self.stdout.write(f'{"страница":<14}{"p50":>9}{"p95":>9}{"p99":>9}'
+                          f'{"запросов":>10}{"память, КБ":>12}')
+        for name, result in results.items():
+            line = (f'{name:<14}{result["p50_ms"]:>9.2f}'
+                    f'{result["p95_ms"]:>9.2f}{result["p99_ms"]:>9.2f}'
+                    f'{result["queries"]:>10}'
+                    f'{result["allocated_bytes"] / 1024:>12.1f}')
+            if name in previous:
+                change = result['p50_ms'] / previous[name]['p50_ms'] - 1
+                line += f'  p50 {change:+.0%}'
+            self.stdout.write(line)
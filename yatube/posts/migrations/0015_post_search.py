@@ -0,0 +1,45 @@
+from django.db import migrations
+
+# Схема на момент миграции; дальше индекс поддерживает posts.search.
+# Триггеров нет: они ссылались бы на posts_group и auth_user и ломали
+# бы миграции, которые пересоздают эти таблицы.
+CREATE = [
+    '''
+    CREATE VIRTUAL TABLE posts_post_fts USING fts5(
+        text, group_title, author_name,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    ''',
+    '''
+    INSERT INTO posts_post_fts (rowid, text, group_title, author_name)
+    SELECT post.id, post.text, post_group.title,
+        author.first_name || ' ' || author.last_name || ' '
+        || author.username
+    FROM posts_post post
+    JOIN auth_user author ON author.id = post.author_id
+    LEFT JOIN posts_group post_group ON post_group.id = post.group_id
+    ''',
+]
+DROP = ['DROP TABLE IF EXISTS posts_post_fts']
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        # FTS5 есть только в SQLite; на других базах поиск идёт
+        # через LIKE (см. posts.search)
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_image_placeholder'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(CREATE), run(DROP)),
+    ]
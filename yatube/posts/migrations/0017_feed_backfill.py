@@ -0,0 +1,52 @@
+# Generated by Django 2.2.16 on 2026-10-17 05:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Ленты теперь читаются только из FeedItem, поэтому старые посты
+# нужно разослать: не больше FEED_MAX_ITEMS последних постов каждого
+# автора и записей в каждой ленте.
+FILL_FEEDS = '''
+INSERT INTO posts_feeditem (user_id, post_id, pub_date)
+SELECT user_id, id, pub_date FROM (
+    SELECT f.user_id, p.id, p.pub_date, ROW_NUMBER() OVER (
+        PARTITION BY f.user_id ORDER BY p.pub_date DESC, p.id DESC
+    ) AS position
+    FROM posts_follow f JOIN (
+        SELECT id, author_id, pub_date, ROW_NUMBER() OVER (
+            PARTITION BY author_id ORDER BY pub_date DESC, id DESC
+        ) AS position
+        FROM posts_post WHERE fanned_out
+    ) p ON p.author_id = f.author_id AND p.position <= %s
+) feed WHERE position <= %s
+'''
+
+
+def fill_feeds(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    FeedItem = apps.get_model('posts', 'FeedItem')
+    Post.objects.exclude(
+        author__counters__followers_count__gte=settings.FEED_FANOUT_LIMIT
+    ).update(fanned_out=True)
+    FeedItem.objects.all().delete()
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(FILL_FEEDS, [settings.FEED_MAX_ITEMS] * 2)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='feeditem',
+            name='posts_feedi_user_id_b6d75a_idx',
+        ),
+        migrations.AddIndex(
+            model_name='feeditem',
+            index=models.Index(fields=['user', '-pub_date', '-post'], name='posts_feedi_user_id_82929a_idx'),
+        ),
+        migrations.RunPython(fill_feeds, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.16 on 2026-10-17 06:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_feed_backfill'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', 'fanned_out', '-pub_date', '-id'], name='posts_post_author__80f39a_idx'),
+        ),
+    ]
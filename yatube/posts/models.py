@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from .storage import image_storage
+
 User = get_user_model()
 
 
@@ -20,11 +22,24 @@ class Group(models.Model):
         verbose_name='Описание группы',
         help_text='Введите описание группы',
     )
+    posts_count = models.PositiveIntegerField(
+        'Число постов',
+        default=0,
+        editable=False,
+    )
 
     def __str__(self):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_listing(self):
+        """Посты для лент: автор и группа подтягиваются тем же запросом,
+        число комментариев берётся из денормализованного comments_count.
+        """
+        return self.select_related('author', 'group')
+
+
 class Post(models.Model):
     text = models.TextField(
         verbose_name='Текст поста',
@@ -52,15 +67,48 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=image_storage,
         blank=True,
+        db_index=True,
         help_text='Выберите изображение для поста'
     )
+    # крошечное превью (data: URI), которое показывается, пока
+    # грузится миниатюра; заполняется при сохранении
+    image_placeholder = models.TextField(
+        'Превью картинки',
+        blank=True,
+        editable=False,
+    )
+    # True, если пост разослан в ленты подписчиков (FeedItem).
+    # Посты авторов с большим числом подписчиков не рассылаются
+    # и подмешиваются в ленту при чтении.
+    fanned_out = models.BooleanField(
+        'Разослан в ленты',
+        default=False,
+        editable=False,
+    )
+    comments_count = models.PositiveIntegerField(
+        'Число комментариев',
+        default=0,
+        editable=False,
+    )
+
+    objects = PostQuerySet.as_manager()
 
     def __str__(self):
         return self.text[:15]
 
     class Meta:
         ordering = ['-pub_date']
+        # ленты идут по (-pub_date, -id), см. CursorPaginator
+        indexes = [
+            models.Index(fields=['-pub_date', '-id']),
+            models.Index(fields=['author', '-pub_date', '-id']),
+            models.Index(fields=['group', '-pub_date', '-id']),
+            # не разосланные посты авторов из подписок, см. FeedPaginator
+            models.Index(fields=['author', 'fanned_out', '-pub_date',
+                                 '-id']),
+        ]
 
 
 class Comment(models.Model):
@@ -82,6 +130,7 @@ class Comment(models.Model):
     created = models.DateTimeField(
         verbose_name='Дата публикации',
         auto_now_add=True,
+        db_index=True,
     )
 
     def __str__(self):
@@ -89,6 +138,9 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['-created']
+        indexes = [
+            models.Index(fields=['post', '-created', '-id']),
+        ]
 
 
 class Follow(models.Model):
@@ -105,6 +157,63 @@ class Follow(models.Model):
 
     class Meta:
         unique_together = ['user', 'author']
+        # подписчики автора; обратный к индексу unique_together
+        indexes = [
+            models.Index(fields=['author', 'user']),
+        ]
 
     def __str__(self):
         return f'{self.user} подписан на {self.author}'
+
+
+class FeedItem(models.Model):
+    """Запись материализованной ленты подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+    )
+    # Копия Post.pub_date, чтобы сортировать ленту без join
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        unique_together = ['user', 'post']
+        ordering = ['-pub_date']
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post']),
+        ]
+
+    def __str__(self):
+        return f'{self.post_id} в ленте {self.user_id}'
+
+
+class UserCounters(models.Model):
+    """Денормализованные счётчики пользователя.
+    Поддерживаются сигналами, сверяются командой recount.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counters',
+    )
+    posts_count = models.PositiveIntegerField(
+        'Число постов',
+        default=0,
+    )
+    followers_count = models.PositiveIntegerField(
+        'Число подписчиков',
+        default=0,
+    )
+    following_count = models.PositiveIntegerField(
+        'Число подписок',
+        default=0,
+    )
+
+    def __str__(self):
+        return f'Счётчики {self.user_id}'
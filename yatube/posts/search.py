@@ -0,0 +1,198 @@
+"""Полнотекстовый поиск по постам.
+
+В SQLite используется индекс FTS5 posts_post_fts (текст поста,
+название группы, имя автора). Это самостоятельная таблица без
+триггеров: её строки обновляют сигналы (см. posts.signals), а
+массовые загрузки в обход ORM вызывают index() или rebuild() сами.
+Поэтому миграции, пересоздающие posts_post, posts_group или auth_user,
+индексу не мешают. Результаты ранжируются по bm25 и листаются курсором
+(оценка, id). На других базах поиск деградирует до LIKE.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+from django.utils.safestring import mark_safe
+
+# rowid строки индекса равен id поста; схема миграции 0015 — её копия
+CREATE_TABLE = """
+    CREATE VIRTUAL TABLE posts_post_fts USING fts5(
+        text, group_title, author_name,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+"""
+INSERT_SQL = """
+    INSERT INTO posts_post_fts (rowid, text, group_title, author_name)
+    SELECT post.id, post.text, post_group.title,
+        author.first_name || ' ' || author.last_name || ' '
+        || author.username
+    FROM posts_post post
+    JOIN auth_user author ON author.id = post.author_id
+    LEFT JOIN posts_group post_group ON post_group.id = post.group_id
+"""
+
+
+def enabled():
+    return connection.vendor == 'sqlite'
+
+
+def index(posts):
+    """Заново индексирует посты из queryset posts."""
+    if not enabled():
+        return
+    subquery, params = posts.values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM posts_post_fts WHERE rowid IN ({subquery})', params
+        )
+        cursor.execute(f'{INSERT_SQL} WHERE post.id IN ({subquery})', params)
+
+
+def unindex(*pks):
+    if not enabled() or not pks:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'DELETE FROM posts_post_fts WHERE rowid IN '
+            f'({", ".join(["%s"] * len(pks))})', pks
+        )
+
+
+def rebuild():
+    """Строит индекс по всем постам заново."""
+    if not enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM posts_post_fts')
+        cursor.execute(INSERT_SQL)
+
+
+# вес совпадений в тексте, названии группы и имени автора для bm25
+WEIGHTS = (1.0, 3.0, 2.0)
+MARK_START, MARK_END = '\x02', '\x03'
+SNIPPET_TOKENS = 24
+SEARCH_SQL = """
+    SELECT rowid, bm25(posts_post_fts, {weights}) AS score,
+        snippet(posts_post_fts, 0, '{start}', '{end}', '…', {tokens})
+    FROM posts_post_fts
+    WHERE posts_post_fts MATCH %s {after}
+    ORDER BY score, rowid
+    LIMIT %s
+"""
+AFTER_SQL = (
+    'AND (bm25(posts_post_fts, {weights}) > %s '
+    'OR (bm25(posts_post_fts, {weights}) = %s AND rowid > %s))'
+)
+
+
+def match_query(text):
+    """Запрос FTS5 из пользовательского ввода: все слова обязательны,
+    последнее ищется как префикс. Синтаксис FTS5 во вводе
+    не интерпретируется.
+    """
+    words = re.findall(r'\w+', text.lower())
+    if not words:
+        return None
+    return ' '.join(f'"{word}"' for word in words) + '*'
+
+
+def encode_cursor(score, pk):
+    return urlsafe_base64_encode(f'{score!r}|{pk}'.encode())
+
+
+def decode_cursor(token):
+    try:
+        score, pk = urlsafe_base64_decode(token).decode().split('|')
+        return float(score), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def highlight(snippet):
+    """Экранирует фрагмент и выделяет найденные слова <mark>."""
+    return mark_safe(
+        escape(snippet).replace(MARK_START, '<mark>')
+        .replace(MARK_END, '</mark>')
+    )
+
+
+def _fts_rows(query, after, limit):
+    weights = ', '.join(map(str, WEIGHTS))
+    params = [query]
+    after_sql = ''
+    if after:
+        after_sql = AFTER_SQL.format(weights=weights)
+        params += [after[0], after[0], after[1]]
+    sql = SEARCH_SQL.format(weights=weights, start=MARK_START,
+                            end=MARK_END, tokens=SNIPPET_TOKENS,
+                            after=after_sql)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params + [limit])
+        return cursor.fetchall()
+
+
+def _like(text):
+    # те же поля, что в индексе FTS5
+    return (Q(text__icontains=text) | Q(group__title__icontains=text)
+            | Q(author__first_name__icontains=text)
+            | Q(author__last_name__icontains=text)
+            | Q(author__username__icontains=text))
+
+
+def _like_rows(text, after, limit):
+    """Запасной путь без FTS5: LIKE по тем же полям, по порядку id."""
+    from .models import Post
+    posts = Post.objects.filter(_like(text))
+    if after:
+        posts = posts.filter(pk__gt=after[1])
+    return [(pk, 0.0, text[:200])
+            for pk, text in posts.order_by('pk')
+            .values_list('pk', 'text')[:limit]]
+
+
+def matching(queryset, text):
+    """Посты из queryset, подходящие под запрос, без ранжирования
+    (для админки и других мест со своей сортировкой).
+    """
+    query = match_query(text)
+    if query is None:
+        return queryset
+    if not enabled():
+        return queryset.filter(_like(text))
+    return queryset.filter(pk__in=RawSQL(
+        'SELECT rowid FROM posts_post_fts WHERE posts_post_fts MATCH %s',
+        [query],
+    ))
+
+
+def search(text, after=None, limit=None):
+    """Посты по запросу text в порядке релевантности.
+
+    Возвращает (посты, курсор следующей страницы или None); у каждого
+    поста есть snippet — фрагмент текста с выделенными словами.
+    """
+    from .models import Post
+    limit = limit or settings.POSTS_PER_PAGE
+    after = after and decode_cursor(after)
+    query = match_query(text)
+    if query is None:
+        return [], None
+    if enabled():
+        rows = _fts_rows(query, after, limit + 1)
+    else:
+        rows = _like_rows(text, after, limit + 1)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][1], rows[-1][0])
+    posts = Post.objects.for_listing().in_bulk([pk for pk, _, _ in rows])
+    results = []
+    for pk, _, snippet in rows:
+        if pk in posts:
+            posts[pk].snippet = highlight(snippet)
+            results.append(posts[pk])
+    return results, next_cursor
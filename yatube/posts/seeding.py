@@ -0,0 +1,302 @@
+"""Генерация правдоподобных данных для бенчмарков и стендов.
+
+Популярность авторов подчиняется закону Ципфа: немногие пишут много
+и собирают большую часть подписчиков, у остальных почти никого.
+Один и тот же seed даёт одни и те же данные. Строки идут потоком
+пачками через executemany, в обход ORM и сигналов, поэтому поисковый
+индекс строится по новым постам одним запросом, а счётчики и ленты
+подписок считаются в конце отдельно (finish).
+"""
+import bisect
+import random
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from io import BytesIO
+from itertools import accumulate, islice
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.utils import timezone
+from faker import Faker
+from PIL import Image, ImageDraw
+from sorl.thumbnail.images import ImageFile
+
+from . import feed, images, search
+from .counters import recount_all
+from .models import Comment, Follow, Group, Post, User
+
+# дата, которой по умолчанию заканчиваются данные: один и тот же
+# seed даёт те же даты в любой день
+END = datetime(2026, 1, 1, tzinfo=timezone.utc)
+# строк в одном executemany
+BATCH_SIZE = 1000
+# строк в одной транзакции
+TRANSACTION_SIZE = 100000
+# показатель степени в законе Ципфа для популярности авторов и постов
+ZIPF_EXPONENT = 1.1
+PLACEHOLDER_SIZE = (1280, 720)
+
+
+class Zipf:
+    """Случайный номер от 0 до size - 1; номер k выпадает с
+    вероятностью, пропорциональной 1 / (k + 1) ** exponent.
+    """
+    def __init__(self, size, rng, exponent=ZIPF_EXPONENT):
+        self.rng = rng
+        self.cumulative = list(accumulate(
+            1 / rank ** exponent for rank in range(1, size + 1)
+        ))
+
+    def __call__(self):
+        point = self.rng.random() * self.cumulative[-1]
+        return bisect.bisect(self.cumulative, point)
+
+
+def chunks(iterable, size=BATCH_SIZE):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def insert(model, names, rows, transaction_size=TRANSACTION_SIZE):
+    """Вставляет кортежи значений полей names и возвращает id первой
+    строки. Остальные поля получают значения по умолчанию.
+
+    Следующие id идут подряд: так бывает при вставке без параллельных
+    писателей, это проверяется.
+    """
+    fields = [model._meta.get_field(name) for name in names]
+    rest = [field for field in model._meta.local_concrete_fields
+            if not field.primary_key and field not in fields]
+    defaults = tuple(field.get_db_prep_save(field.get_default(), connection)
+                     for field in rest)
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(field.column) for field in fields + rest)
+    sql = (f'INSERT INTO {quote(model._meta.db_table)} ({columns}) '
+           f'VALUES ({", ".join(["%s"] * (len(fields) + len(rest)))})')
+    last = model.objects.order_by('-pk').values_list('pk', flat=True)
+    before = last.first() or 0
+    count = 0
+    for part in chunks(rows, transaction_size):
+        with transaction.atomic(), connection.cursor() as cursor:
+            for chunk in chunks(part):
+                cursor.executemany(sql, [row + defaults for row in chunk])
+        count += len(part)
+    first = model.objects.filter(pk__gt=before).order_by('pk').values_list(
+        'pk', flat=True
+    ).first()
+    if count and last.first() - first + 1 != count:
+        raise RuntimeError(f'id строк {model.__name__} идут не подряд')
+    return first
+
+
+def _indexes(models):
+    """Некритичные для вставки индексы моделей: Meta.indexes и
+    индексы полей с db_index (без уникальных и первичных ключей).
+    """
+    editor = connection.schema_editor()
+    for model in models:
+        for index in model._meta.indexes:
+            yield (str(index.remove_sql(model, editor)),
+                   str(index.create_sql(model, editor)))
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, model._meta.db_table
+            )
+        for field in model._meta.local_concrete_fields:
+            if not field.db_index or field.unique:
+                continue
+            for name, constraint in constraints.items():
+                if (constraint['index'] and not constraint['unique']
+                        and constraint['columns'] == [field.column]):
+                    yield (str(editor._delete_index_sql(model, name)),
+                           str(editor._create_index_sql(model, [field],
+                                                        name=name)))
+
+
+@contextmanager
+def deferred_indexes(*models):
+    """Снимает индексы на время загрузки и строит их заново один раз
+    в конце: это быстрее, чем обновлять их на каждой строке.
+    """
+    statements = list(_indexes(models))
+    with transaction.atomic(), connection.cursor() as cursor:
+        for drop, _ in statements:
+            cursor.execute(drop)
+    try:
+        yield
+    finally:
+        with transaction.atomic(), connection.cursor() as cursor:
+            for _, create in statements:
+                cursor.execute(create)
+
+
+def placeholder(task):
+    """Сохраняет index-ю картинку-заглушку и возвращает имя файла
+    и превью для Post.image_placeholder.
+    """
+    seed, index = task
+    rng = random.Random(f'{seed}-{index}')
+    picture = Image.new('RGB', PLACEHOLDER_SIZE,
+                        tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(picture)
+    width, height = PLACEHOLDER_SIZE
+    for _ in range(8):
+        left, top = rng.randrange(width), rng.randrange(height)
+        draw.ellipse(
+            (left, top, left + rng.randrange(50, width // 2),
+             top + rng.randrange(50, height // 2)),
+            fill=tuple(rng.randrange(256) for _ in range(3)),
+        )
+    buffer = BytesIO()
+    picture.save(buffer, 'JPEG', quality=settings.IMAGE_UPLOAD_QUALITY)
+    storage = Post.image.field.storage
+    name = storage.save('posts/seed.jpg', ContentFile(buffer.getvalue()))
+    return name, images.placeholder(ImageFile(name, storage))
+
+
+class Seeder:
+    def __init__(self, seed=0, days=365, end=None,
+                 transaction_size=TRANSACTION_SIZE):
+        self.rng = random.Random(seed)
+        self.faker = Faker('ru_RU')
+        self.faker.seed_instance(seed)
+        self.prefix = f's{seed}-'
+        self.end = end or END
+        self.start = self.end - timedelta(days=days)
+        self.transaction_size = transaction_size
+
+    def insert(self, model, names, rows):
+        return insert(model, names, rows, self.transaction_size)
+
+    def words(self, count):
+        # словарь берём у Faker один раз: генерировать им каждый
+        # пост на миллионах строк слишком медленно
+        vocabulary = self.faker.words(count)
+        zipf = Zipf(len(vocabulary), self.rng)
+        return lambda size: ' '.join(vocabulary[zipf()] for _ in range(size))
+
+    def date(self, num, total):
+        """Дата num-й из total записей: id растут вместе с датами."""
+        span = (self.end - self.start).total_seconds()
+        return self.start + timedelta(seconds=span * (num + 1) / total)
+
+    def users(self, count):
+        first_names = [self.faker.first_name() for _ in range(200)]
+        last_names = [self.faker.last_name() for _ in range(200)]
+        joined = connection.ops.adapt_datetimefield_value(self.start)
+        return self.insert(
+            User,
+            ['username', 'first_name', 'last_name', 'password',
+             'date_joined'],
+            ((f'{self.prefix}{num}', self.rng.choice(first_names),
+              self.rng.choice(last_names), '!', joined)
+             for num in range(count)),
+        )
+
+    def groups(self, count):
+        return self.insert(
+            Group, ['title', 'slug', 'description'],
+            ((self.faker.catch_phrase()[:200], f'{self.prefix}{num}',
+              self.faker.sentence())
+             for num in range(count)),
+        )
+
+    def posts(self, count, users, groups, pictures=(), image_share=0):
+        text = self.words(2000)
+        author = Zipf(users[1], self.rng)
+        adapt = connection.ops.adapt_datetimefield_value
+        no_image = ('', '')
+
+        def post(num):
+            group = None
+            if groups[1] and self.rng.random() < 0.7:
+                group = groups[0] + self.rng.randrange(groups[1])
+            image = no_image
+            if pictures and self.rng.random() < image_share:
+                image = self.rng.choice(pictures)
+            return (text(self.rng.randint(5, 60)), users[0] + author(),
+                    group, adapt(self.date(num, count)), *image)
+
+        return self.insert(
+            Post,
+            ['text', 'author', 'group', 'pub_date', 'image',
+             'image_placeholder'],
+            (post(num) for num in range(count)),
+        )
+
+    def comments(self, count, users, posts):
+        text = self.words(500)
+        # комментируют в основном свежие посты
+        recent = Zipf(posts[1], self.rng, exponent=0.8)
+        adapt = connection.ops.adapt_datetimefield_value
+
+        def comment():
+            num = posts[1] - 1 - recent()
+            created = self.date(num, posts[1]) + timedelta(
+                minutes=self.rng.randrange(1, 24 * 60)
+            )
+            return (posts[0] + num,
+                    users[0] + self.rng.randrange(users[1]),
+                    text(self.rng.randint(2, 20)),
+                    adapt(min(created, self.end)))
+
+        return self.insert(
+            Comment, ['post', 'author', 'text', 'created'],
+            (comment() for _ in range(count)),
+        )
+
+    def follows(self, count, users):
+        author = Zipf(users[1], self.rng)
+        pairs = set()
+        # редкие пары выпадают редко: число попыток ограничено
+        for _ in range(count * 20):
+            if len(pairs) >= count:
+                break
+            pair = (self.rng.randrange(users[1]), author())
+            if pair[0] != pair[1]:
+                pairs.add(pair)
+        self.insert(
+            Follow, ['user', 'author'],
+            ((users[0] + user, users[0] + author)
+             for user, author in sorted(pairs)),
+        )
+        return len(pairs)
+
+
+def seed(users=1000, groups=20, posts=10000, comments=20000,
+         follows=20000, seed=0, days=365, end=None, pictures=(),
+         image_share=0, transaction_size=TRANSACTION_SIZE, deferred=False):
+    """Заполняет базу и возвращает число созданных строк по моделям.
+
+    pictures — картинки-заглушки из placeholder(), их получает доля
+    image_share постов. С deferred=True счётчики и ленты не строятся:
+    их считают вызовом finish() после восстановления индексов.
+    """
+    seeder = Seeder(seed, days, end, transaction_size)
+    users = (seeder.users(users), users)
+    groups = (seeder.groups(groups), groups)
+    posts = (seeder.posts(posts, users, groups, pictures, image_share),
+             posts)
+    if posts[1]:
+        # поисковый индекс — одним INSERT ... SELECT по новым постам
+        search.index(Post.objects.filter(pk__gte=posts[0]))
+    seeder.comments(comments, users, posts)
+    follows = seeder.follows(follows, users)
+    if not deferred:
+        finish()
+    return {'users': users[1], 'groups': groups[1], 'posts': posts[1],
+            'comments': comments, 'follows': follows}
+
+
+def finish():
+    """Счётчики и ленты подписок для данных, вставленных в обход
+    сигналов.
+    """
+    for _ in recount_all(BATCH_SIZE):
+        pass
+    feed.rebuild()
@@ -0,0 +1,181 @@
+from django.db import transaction
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from core import metrics
+
+from . import feed, counters, caching, images, search
+from .models import Post, Follow, Comment, User, UserCounters, Group
+
+
+def group_slugs(*group_ids):
+    return list(Group.objects.filter(
+        pk__in=[pk for pk in group_ids if pk]
+    ).values_list('slug', flat=True))
+
+
+def forget_groups(*group_ids):
+    """Горячие копии групп устарели: у них сменилось число постов."""
+    caching.forget(groups=group_slugs(*group_ids))
+
+
+def release_image(name):
+    """Картинка больше не нужна этому посту; удаляется после коммита,
+    если на неё не ссылаются другие посты.
+    """
+    transaction.on_commit(lambda: images.release(name))
+
+
+# поля пользователя, которые попадают в поисковый индекс его постов
+SEARCH_USER_FIELDS = {'first_name', 'last_name', 'username'}
+
+
+def post_scopes(post, *group_ids):
+    """Области страничного кэша, на которых виден пост."""
+    slugs = group_slugs(*group_ids)
+    return [
+        'index',
+        f'post:{post.pk}',
+        f'profile:{post.author.username}',
+        *(f'group:{slug}' for slug in slugs),
+    ]
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields, **kwargs):
+    if created:
+        UserCounters.objects.get_or_create(user=instance)
+    else:
+        fields = set(update_fields or ())
+        # last_login пишется при каждом входе и нигде не показывается
+        if fields and fields <= {'last_login'}:
+            return
+        if not fields or fields & SEARCH_USER_FIELDS:
+            search.index(Post.objects.filter(author=instance))
+    caching.forget(authors=[instance.username])
+    caching.bump(f'profile:{instance.username}')
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, **kwargs):
+    if not created:
+        search.index(Post.objects.filter(group=instance))
+    caching.forget(groups=[instance.slug])
+    caching.bump('index', f'group:{instance.slug}')
+
+
+@receiver(pre_delete, sender=Group)
+def group_pre_delete(sender, instance, **kwargs):
+    # после удаления у постов group_id уже NULL, их не найти
+    posts = list(instance.posts.values_list('pk', 'author__username'))
+    instance._post_ids = [pk for pk, _ in posts]
+    instance._scopes = ['index', f'group:{instance.slug}']
+    for pk, username in posts:
+        instance._scopes += [f'post:{pk}', f'profile:{username}']
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    search.index(Post.objects.filter(pk__in=instance._post_ids))
+    caching.forget(groups=[instance.slug])
+    caching.bump(*set(instance._scopes))
+
+
+@receiver(pre_save, sender=Post)
+def post_pre_save(sender, instance, **kwargs):
+    # запоминаем автора, группу и картинку до правки: счётчики надо
+    # перенести, а ставшую ненужной картинку удалить
+    instance._previous_author_id = instance.author_id
+    instance._previous_group_id = None
+    instance._previous_image = ''
+    if instance.pk:
+        (instance._previous_author_id, instance._previous_group_id,
+         instance._previous_image) = (
+            Post.objects.filter(pk=instance.pk)
+            .values_list('author_id', 'group_id', 'image').first()
+            or (instance.author_id, None, '')
+        )
+    image = instance.image
+    if not image._committed or image.name != instance._previous_image:
+        instance.image_placeholder = images.placeholder(image)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    search.index(Post.objects.filter(pk=instance.pk))
+    if created:
+        metrics.inc('yatube_posts_created_total')
+        counters.bump_user(instance.author_id, posts_count=1)
+        counters.bump_group(instance.group_id, 1)
+        forget_groups(instance.group_id)
+        feed.fan_out(instance)
+        caching.bump(*post_scopes(instance, instance.group_id))
+        return
+    previous = getattr(instance, '_previous_group_id', None)
+    if previous != instance.group_id:
+        counters.bump_group(previous, -1)
+        counters.bump_group(instance.group_id, 1)
+        forget_groups(previous, instance.group_id)
+    scopes = post_scopes(instance, instance.group_id, previous)
+    previous_author = getattr(instance, '_previous_author_id',
+                              instance.author_id)
+    if previous_author != instance.author_id:
+        counters.bump_user(previous_author, posts_count=-1)
+        counters.bump_user(instance.author_id, posts_count=1)
+        feed.reassign(instance)
+        scopes += [f'profile:{username}' for username in
+                   User.objects.filter(pk=previous_author)
+                   .values_list('username', flat=True)]
+    caching.bump(*scopes)
+    previous_image = getattr(instance, '_previous_image', '')
+    if previous_image and previous_image != instance.image.name:
+        release_image(previous_image)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    search.unindex(instance.pk)
+    counters.bump_user(instance.author_id, posts_count=-1)
+    counters.bump_group(instance.group_id, -1)
+    forget_groups(instance.group_id)
+    caching.bump(*post_scopes(instance, instance.group_id))
+    if instance.image:
+        release_image(instance.image.name)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        metrics.inc('yatube_comments_created_total')
+        counters.bump_post(instance.post_id, 1)
+        # число комментариев видно и в карточках лент
+        post = instance.post
+        caching.bump(*post_scopes(post, post.group_id))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.bump_post(instance.post_id, -1)
+    post = instance.post
+    caching.bump(*post_scopes(post, post.group_id))
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        metrics.inc('yatube_follows_created_total')
+        counters.bump_user(instance.author_id, followers_count=1)
+        counters.bump_user(instance.user_id, following_count=1)
+        feed.backfill(instance.user, instance.author)
+        caching.bump(f'profile:{instance.author.username}',
+                     f'profile:{instance.user.username}')
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.bump_user(instance.author_id, followers_count=-1)
+    counters.bump_user(instance.user_id, following_count=-1)
+    feed.remove_author(instance.user_id, instance.author_id)
+    caching.bump(f'profile:{instance.author.username}',
+                 f'profile:{instance.user.username}')
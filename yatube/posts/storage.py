@@ -0,0 +1,83 @@
+"""Хранилище картинок постов по хэшу содержимого.
+
+Файл называется sha256 своего содержимого: одинаковые загрузки
+ложатся в один файл (и у sorl получают одни миниатюры). Счётчиком
+ссылок служит сама база: файл удаляется, когда на него не ссылается
+ни один пост (см. posts.signals.release_image).
+"""
+import hashlib
+import os
+import re
+import tempfile
+import time
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+CHUNK_SIZE = 64 * 1024
+DIGEST_RE = re.compile(r'[0-9a-f]{64}')
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    content_addressed = True
+
+    @staticmethod
+    def digest(name):
+        """Хэш содержимого из имени файла или None для старых имён."""
+        stem = os.path.splitext(os.path.basename(name))[0]
+        return stem if DIGEST_RE.fullmatch(stem) else None
+
+    def save(self, name, content, max_length=None):
+        """Сохраняет файл под именем <каталог>/<ab>/<sha256>.<ext>;
+        если такой файл уже есть, второй раз не пишет.
+        """
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        sha = hashlib.sha256()
+        for chunk in content.chunks(CHUNK_SIZE):
+            sha.update(chunk)
+        digest = sha.hexdigest()
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        name = os.path.join(directory, digest[:2], digest + extension)
+        if self.exists(name):
+            # свежее время изменения защищает файл от удаления
+            # последней ссылки, случившегося одновременно с загрузкой
+            os.utime(self.path(name))
+            return name.replace('\\', '/')
+        content.seek(0)
+        return self._save(name, content).replace('\\', '/')
+
+    def _save(self, name, content):
+        # пишем во временный файл и публикуем его жёсткой ссылкой:
+        # одновременные загрузки одного содержимого не мешают друг другу
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(descriptor, 'wb') as target:
+                for chunk in content.chunks():
+                    target.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(temporary, self.file_permissions_mode)
+            try:
+                os.link(temporary, full_path)
+            except FileExistsError:
+                pass
+        finally:
+            os.unlink(temporary)
+        return name
+
+    def recently_saved(self, name, seconds):
+        try:
+            return time.time() - os.path.getmtime(self.path(name)) < seconds
+        except FileNotFoundError:
+            return False
+
+
+image_storage = ContentAddressedStorage()
@@ -0,0 +1,14 @@
+from django import template
+
+from posts import caching
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_cards(posts, card='includes/post_card.html'):
+    """Готовый HTML карточек постов страницы из кэша.
+
+    {% post_cards page_obj as cards %}
+    """
+    return caching.post_cards(list(posts), card)
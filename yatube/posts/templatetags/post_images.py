@@ -0,0 +1,57 @@
+from django import template
+from django.conf import settings
+from PIL import Image
+
+from posts import images, thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def card_image(post, geometry='card'):
+    """Готовая миниатюра картинки поста, а пока её нет — сама картинка.
+
+    {% card_image post as im %}{% if im %}<img src="{{ im.url }}">...
+    """
+    if not post.image:
+        return None
+    thumbnail = thumbnails.stored(post.image, geometry)
+    if thumbnail:
+        return thumbnail
+    # карточку с исходной картинкой не кэшируем (см. caching.post_cards)
+    post.thumbnail_pending = True
+    thumbnails.schedule(post)
+    return post.image
+
+
+@register.simple_tag
+def image_srcset(post, geometry='card', fmt='jpg'):
+    """Значение srcset: картинка поста во всех ширинах из
+    IMAGE_VARIANT_WIDTHS.
+    """
+    if not post.image:
+        return ''
+    return images.srcset(post, geometry, fmt)
+
+
+@register.simple_tag
+def image_sources(post, geometry='card'):
+    """<source> для <picture>: форматы из IMAGE_PICTURE_SOURCES,
+    которые доступны в этой сборке Pillow.
+    """
+    if not post.image:
+        return []
+    available = images.formats()
+    return [
+        {'type': Image.MIME[available[fmt]],
+         'srcset': images.srcset(post, geometry, fmt)}
+        for fmt in settings.IMAGE_PICTURE_SOURCES if fmt in available
+    ]
+
+
+@register.simple_tag
+def image_size(geometry='card'):
+    """Ширина и высота миниатюры для атрибутов width и height."""
+    return images.variant_size(
+        geometry, max(settings.IMAGE_VARIANT_WIDTHS)
+    )
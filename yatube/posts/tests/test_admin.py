@@ -0,0 +1,74 @@
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.test import TestCase, Client
+from django.urls import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from ..models import Post, Group, Comment
+from ..utils import EstimatedCountPaginator
+
+User = get_user_model()
+
+
+class PostAdminTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass',
+        )
+        cls.group = Group.objects.create(title='Классика', slug='classic',
+                                         description='Тестовое описание')
+        cls.post = Post.objects.create(
+            text='Все счастливые семьи похожи друг на друга',
+            author=cls.admin,
+            group=cls.group,
+        )
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.admin)
+        self.url = reverse('admin:posts_post_changelist')
+
+    def test_changelist_queries_do_not_grow(self):
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(self.url)
+        for num in range(10):
+            user = User.objects.create_user(username=f'user{num}')
+            group = Group.objects.create(title=f'Группа {num}',
+                                         slug=f'group-{num}')
+            post = Post.objects.create(text=f'Пост {num}', author=user,
+                                       group=group)
+            Comment.objects.create(post=post, author=user, text='Текст')
+        with CaptureQueriesContext(connection) as many:
+            self.client.get(self.url)
+        self.assertEqual(len(few), len(many))
+        with CaptureQueriesContext(connection) as comments:
+            self.client.get(reverse('admin:posts_comment_changelist'))
+        self.assertLess(len(comments), 10)
+
+    def test_search_uses_index(self):
+        Post.objects.create(text='Война и мир', author=self.admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'q': 'счастлив'})
+        self.assertEqual(list(response.context['cl'].result_list),
+                         [self.post])
+        self.assertTrue(any('posts_post_fts' in query['sql']
+                            for query in queries))
+
+    def test_estimated_count(self):
+        for num in range(3):
+            Post.objects.create(text=f'Пост {num}', author=self.admin)
+        with mock.patch.object(EstimatedCountPaginator, 'limit', 2):
+            response = self.client.get(self.url)
+            self.assertTrue(response.context['cl'].paginator.estimated)
+            self.assertContains(response, 'exact_count=1')
+            response = self.client.get(self.url, {'exact_count': 1})
+        cl = response.context['cl']
+        self.assertFalse(cl.paginator.estimated)
+        self.assertEqual(cl.result_count, 4)
+
+    def test_foreign_keys_use_autocomplete(self):
+        response = self.client.get(reverse('admin:posts_post_change',
+                                           args=(self.post.pk,)))
+        self.assertContains(response, 'admin-autocomplete')
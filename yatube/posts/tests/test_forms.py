@@ -1,11 +1,18 @@
+import hashlib
+import os
 import shutil
 import tempfile
+from io import BytesIO
 from django.contrib.auth import get_user_model
 from django.test import Client, TestCase, override_settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
 from ..models import Group, Post, User, Comment
 from django.conf import settings
+from PIL import Image
+from .. import images
+from ..storage import image_storage
+from ..uploads import ImageUploadHandler
 
 
 User = get_user_model()
@@ -91,11 +98,13 @@ class PostFormTests(TestCase):
         self.assertRedirects(response, reverse(
             'posts:profile', args={self.user.username}))
         self.assertEqual(Post.objects.count(), posts_count + 1)
+        # файл назван по хэшу содержимого
+        digest = hashlib.sha256(small_gif).hexdigest()
         self.assertTrue(
             Post.objects.filter(
                 text='Тестовый текст',
                 group=self.group.id,
-                image='posts/small.gif',
+                image=f'posts/{digest[:2]}/{digest}.gif',
             ).exists()
         )
 
@@ -149,3 +158,78 @@ class PostFormTests(TestCase):
                   "ras, tga, icb, vda, vst, webp, wmf, emf, xbm, xpm'."]
 
         self.assertFormError(response, 'form', 'image', errors)
+
+    def upload(self, image, name, **params):
+        content = BytesIO()
+        image.save(content, **params)
+        return self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={
+                'text': name,
+                'image': SimpleUploadedFile(name, content.getvalue()),
+            },
+        )
+
+    @override_settings(IMAGE_MAX_SIDE=500)
+    def test_large_photo_downscaled(self):
+        """Большое фото уменьшается, поворачивается по EXIF и теряет
+        метаданные.
+        """
+        exif = Image.Exif()
+        exif[0x0112] = 6  # повернуть на 90° по часовой
+        self.upload(Image.new('RGB', (3000, 1000)), 'photo.jpg',
+                    format='JPEG', exif=exif.tobytes())
+        post = Post.objects.get(text='photo.jpg')
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(stored.size, (167, 500))
+            self.assertFalse(stored.getexif())
+        self.assertTrue(
+            post.image_placeholder.startswith('data:image/png;base64,')
+        )
+        self.assertLess(len(post.image_placeholder), 1000)
+
+    @override_settings(IMAGE_MAX_PIXELS=10000)
+    def test_decompression_bomb_rejected(self):
+        response = self.upload(Image.new('RGB', (200, 200)), 'bomb.png',
+                               format='PNG')
+        self.assertFormError(response, 'form', 'image',
+                             'Изображение слишком большое.')
+        self.assertFalse(Post.objects.filter(text='bomb.png').exists())
+
+    @override_settings(IMAGE_MAX_PIXELS=10000)
+    def test_upload_handler_stops_after_header(self):
+        """Слишком большая картинка не пишется на диск целиком."""
+        content = BytesIO()
+        Image.effect_noise((400, 400), 50).save(content, 'PNG')
+        handler = ImageUploadHandler()
+        handler.new_file('image', 'bomb.png', 'image/png', None)
+        data = content.getvalue()
+        for start in range(0, len(data), 1024):
+            handler.receive_data_chunk(data[start:start + 1024], start)
+        upload = handler.file_complete(len(data))
+        self.assertTrue(handler.rejected)
+        self.assertLess(os.path.getsize(upload.temporary_file_path()),
+                        len(data))
+
+    @override_settings(IMAGE_RELEASE_GRACE=0)
+    def test_identical_images_share_file(self):
+        """Одинаковые картинки лежат в одном файле, который удаляется
+        вместе с последним ссылающимся на него постом.
+        """
+        content = BytesIO()
+        Image.new('RGB', (10, 10), 'red').save(content, 'PNG')
+        first, second = (
+            Post.objects.create(
+                author=self.user, text=name,
+                image=SimpleUploadedFile(name, content.getvalue()),
+            )
+            for name in ('first.png', 'second.png')
+        )
+        self.assertEqual(first.image.name, second.image.name)
+        name = first.image.name
+        first.delete()
+        self.assertFalse(images.release(name))
+        self.assertTrue(image_storage.exists(name))
+        second.delete()
+        self.assertTrue(images.release(name))
+        self.assertFalse(image_storage.exists(name))
@@ -1,6 +1,15 @@
+from datetime import datetime, timedelta
+from io import StringIO
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
-from ..models import Group, Post
+from django.db.models import F
+from django.utils import timezone
+from ..models import (Group, Post, Comment, Follow, UserCounters,
+                      FeedItem)
+from .. import search, seeding
+from ..listings import listings
 
 User = get_user_model()
 
@@ -57,3 +66,186 @@ class PostModelTest(TestCase):
             with self.subTest(field=field):
                 self.assertEqual(
                     post._meta.get_field(field).help_text, expected_value)
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='counters',
+            description='Тестовое описание',
+        )
+
+    def test_counters_follow_changes(self):
+        """Счётчики обновляются при создании, правке и удалении."""
+        post = Post.objects.create(author=self.user, text='пост',
+                                   group=self.group)
+        Comment.objects.create(post=post, author=self.reader, text='к')
+        follow = Follow.objects.create(user=self.reader, author=self.user)
+        self.user.counters.refresh_from_db()
+        self.reader.counters.refresh_from_db()
+        self.group.refresh_from_db()
+        post.refresh_from_db()
+        self.assertEqual(self.user.counters.posts_count, 1)
+        self.assertEqual(self.user.counters.followers_count, 1)
+        self.assertEqual(self.reader.counters.following_count, 1)
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(post.comments_count, 1)
+
+        post.group = None
+        post.save()
+        follow.delete()
+        self.group.refresh_from_db()
+        self.user.counters.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(self.user.counters.followers_count, 0)
+        post.delete()
+        self.user.counters.refresh_from_db()
+        self.assertEqual(self.user.counters.posts_count, 0)
+
+    def test_counters_follow_author_change(self):
+        post = Post.objects.create(author=self.user, text='пост')
+        Follow.objects.create(user=self.reader, author=self.user)
+        post.author = self.reader
+        post.save()
+        self.user.counters.refresh_from_db()
+        self.reader.counters.refresh_from_db()
+        self.assertEqual(self.user.counters.posts_count, 0)
+        self.assertEqual(self.reader.counters.posts_count, 1)
+        self.assertFalse(FeedItem.objects.filter(post=post).exists())
+
+    def test_recount_command(self):
+        """Команда recount восстанавливает рассогласованные счётчики."""
+        post = Post.objects.create(author=self.user, text='пост',
+                                   group=self.group)
+        Follow.objects.create(user=self.reader, author=self.user)
+        UserCounters.objects.all().delete()
+        Group.objects.update(posts_count=7)
+        Post.objects.update(comments_count=3)
+        call_command('recount', batch_size=1, stdout=StringIO())
+        counters = UserCounters.objects.get(user=self.user)
+        self.assertEqual(counters.posts_count, 1)
+        self.assertEqual(counters.followers_count, 1)
+        self.assertEqual(
+            UserCounters.objects.get(user=self.reader).following_count, 1
+        )
+        self.assertEqual(Group.objects.get(pk=self.group.pk).posts_count,
+                         1)
+        self.assertEqual(Post.objects.get(pk=post.pk).comments_count, 0)
+
+    def test_user_cascade_delete(self):
+        """Удаление автора каскадом не ломает счётчики подписчика."""
+        author = User.objects.create_user(username='to_delete')
+        post = Post.objects.create(author=author, text='пост',
+                                   group=self.group)
+        Comment.objects.create(post=post, author=self.reader, text='к')
+        Follow.objects.create(user=self.reader, author=author)
+        author_id = author.pk
+        author.delete()
+        self.reader.counters.refresh_from_db()
+        self.group.refresh_from_db()
+        self.assertEqual(self.reader.counters.following_count, 0)
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertFalse(UserCounters.objects.filter(
+            user_id=author_id).exists())
+
+
+class ListingIndexTest(TestCase):
+    """Ленты и выборки идут по индексам, без полного просмотра таблиц
+    и без сортировки во временном B-дереве.
+    """
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.user = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+        cls.post = Post.objects.create(author=cls.author, text='Пост',
+                                       group=cls.group)
+        Comment.objects.create(post=cls.post, author=cls.user, text='Ок')
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def test_listings_use_indexes(self):
+        cursor = (self.post.pub_date, self.post.pk)
+        pages = {'first': {}, 'after': {'after': cursor},
+                 'before': {'before': cursor}}
+        for page, kwargs in pages.items():
+            queries = listings(self.group, self.author, self.post,
+                               self.user, **kwargs)
+            for name, queryset in queries.items():
+                with self.subTest(page=page, name=name):
+                    plan = queryset.explain()
+                    self.assertNotRegex(plan, r'SCAN (posts_\w+|auth_user)\b'
+                                              r'(?! USING (COVERING )?INDEX)')
+                    if name == 'follow_merged':
+                        # посты нескольких авторов сливаются сортировкой,
+                        # но сортируются только не разосланные
+                        self.assertRegex(plan, r'SEARCH posts_post USING '
+                                               r'COVERING INDEX \w+ '
+                                               r'\(author_id=\? AND '
+                                               r'fanned_out=\?')
+                    else:
+                        self.assertNotIn('TEMP B-TREE FOR ORDER BY', plan)
+                    if kwargs and name not in ('follow_merged', 'followers'):
+                        # страница за курсором ищет по индексу его
+                        # границу, а не просматривает индекс с начала
+                        self.assertRegex(plan, r'\((\w+=\? AND )?'
+                                               r'(pub_date|created)[<>]\?\)')
+
+
+class SeedingTest(TestCase):
+    def test_seed(self):
+        counts = seeding.seed(users=50, groups=3, posts=300, comments=200,
+                              follows=150, seed=1)
+        self.assertEqual(Post.objects.count(), 300)
+        self.assertEqual(Follow.objects.count(), counts['follows'])
+        # счётчики посчитаны, хотя сигналы не срабатывали
+        top = UserCounters.objects.order_by('-followers_count').first()
+        self.assertEqual(top.followers_count,
+                         Follow.objects.filter(author=top.user).count())
+        followers = sorted(UserCounters.objects.values_list(
+            'followers_count', flat=True))
+        # у самого популярного автора подписчиков много больше медианы
+        self.assertGreater(followers[-1], 5 * followers[len(followers) // 2])
+        self.assertTrue(FeedItem.objects.exists())
+        self.assertEqual(Comment.objects.filter(
+            created__lt=F('post__pub_date')).count(), 0)
+
+    def test_same_seed_gives_same_data(self):
+        seeding.seed(users=20, groups=2, posts=50, comments=20,
+                     follows=30, seed=3)
+        first = list(Post.objects.order_by('pk').values_list(
+            'text', 'pub_date', 'author__username'))
+        Group.objects.all().delete()
+        User.objects.all().delete()
+        seeding.seed(users=20, groups=2, posts=50, comments=20,
+                     follows=30, seed=3)
+        second = list(Post.objects.order_by('pk').values_list(
+            'text', 'pub_date', 'author__username'))
+        self.assertEqual(first, second)
+
+    def test_seed_command_restores_indexes(self):
+        def schema():
+            return sorted(connection.introspection.get_constraints(
+                connection.cursor(), Post._meta.db_table))
+
+        before = schema()
+        output = StringIO()
+        call_command('seed', '--end=2020-06-01', users=30, groups=2,
+                     posts=200, comments=100, follows=50, stdout=output)
+        self.assertIn('posts 200', output.getvalue())
+        end = datetime(2020, 6, 1, tzinfo=timezone.utc)
+        latest = Post.objects.latest('pub_date').pub_date
+        self.assertLessEqual(latest, end)
+        self.assertGreater(latest, end - timedelta(days=30))
+        self.assertEqual(schema(), before)
+        # поисковый индекс построен заново по загруженным постам
+        word = Post.objects.first().text.split()[0]
+        self.assertTrue(Post.objects.filter(
+            pk__in=[post.pk for post in search.search(word)[0]]
+        ).exists())
@@ -1,13 +1,27 @@
+import json
+import os
 import shutil
 import tempfile
+import threading
+import time
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 from django.contrib.auth import get_user_model
 from django.test import TestCase, Client, override_settings
-from ..models import Post, Group, User, Follow
+from ..models import Post, Group, User, Follow, FeedItem, Comment
 from django.urls import reverse
 from django import forms
 from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.core.cache import cache
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from .. import caching, images, search, thumbnails
+from PIL import Image
+from ..storage import image_storage
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 
 User = get_user_model()
@@ -156,6 +170,28 @@ class PostViewTests(TestCase):
         self.assertEqual(response.status_code, 404)
         self.assertTemplateUsed(response, 'core/404.html')
 
+    def test_post_detail_shows_only_own_comments(self):
+        """На странице поста только его комментарии, порциями."""
+        other_post = Post.objects.create(text='Другой пост',
+                                         author=self.user)
+        Comment.objects.create(post=other_post, author=self.user,
+                               text='чужой комментарий')
+        for num in range(settings.COMMENTS_PER_PAGE + 1):
+            Comment.objects.create(post=self.post, author=self.user,
+                                   text=f'комментарий {num}')
+        response = self.guest_client.get(reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.id}))
+        comments = response.context['comments']
+        self.assertEqual(len(comments), settings.COMMENTS_PER_PAGE)
+        self.assertTrue(all(c.post_id == self.post.id for c in comments))
+        more = self.guest_client.get(
+            reverse('posts:comments_more', kwargs={'post_id': self.post.id})
+            + f'?after={comments.next_cursor}'
+        )
+        self.assertEqual(len(more.context['comments']), 1)
+        self.assertContains(more, 'комментарий 0')
+        self.assertNotContains(more, 'чужой комментарий')
+
 
 class PaginatorViewsTest(TestCase):
     @classmethod
@@ -178,6 +214,7 @@ class PaginatorViewsTest(TestCase):
             )
 
     def setUp(self):
+        cache.clear()
         # # Создаем неавторизованный клиент
         self.guest_client = Client()
         # # Создаем авторизованый клиент
@@ -213,7 +250,58 @@ class PaginatorViewsTest(TestCase):
                 self.assertEqual(len(response.context['page_obj']),
                                  TEST_POST_OFFSET)
 
+    def test_cursor_pages(self):
+        """Курсорная пагинация листает страницы без COUNT и OFFSET."""
+        list_namespace = {
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user.username})
+        }
+        for reverse_name in list_namespace:
+            with self.subTest(reverse_name=reverse_name):
+                cache.clear()
+                first = self.client.get(reverse_name).context['page_obj']
+                self.assertIsNone(first.previous_cursor)
+                with CaptureQueriesContext(connection) as queries:
+                    second = self.client.get(
+                        reverse_name + f'?after={first.next_cursor}'
+                    ).context['page_obj']
+                self.assertFalse(any('OFFSET' in query['sql']
+                                     or 'COUNT' in query['sql']
+                                     for query in queries))
+                self.assertEqual(len(second), TEST_POST_OFFSET)
+                self.assertIsNone(second.next_cursor)
+                self.assertEqual(second[0], self.post[TEST_POST_OFFSET - 1])
+                back = self.client.get(
+                    reverse_name + f'?before={second.previous_cursor}'
+                ).context['page_obj']
+                self.assertEqual(list(back), list(first))
+
+    def test_listing_queries_do_not_grow_with_page(self):
+        """Число запросов не зависит от числа постов на странице."""
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=self.user)
+        self.client.force_login(reader)
+        list_namespace = {
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+            reverse('posts:follow_index'),
+        }
+        for reverse_name in list_namespace:
+            with self.subTest(reverse_name=reverse_name):
+                # 'hot' очищает и общий кэш, и свой уровень в памяти
+                caches['hot'].clear()
+                with CaptureQueriesContext(connection) as full_page:
+                    first = self.client.get(reverse_name)
+                caches['hot'].clear()
+                with CaptureQueriesContext(connection) as short_page:
+                    self.client.get(reverse_name + '?after='
+                                    + first.context['page_obj'].next_cursor)
+                self.assertEqual(len(full_page), len(short_page))
+
 
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class ImageInPostView(TestCase):
 
     @classmethod
@@ -252,6 +340,9 @@ class ImageInPostView(TestCase):
         )
 
     def setUp(self):
+        # sorl кэширует свои записи в кэше, который не откатывается
+        # вместе с базой
+        cache.clear()
         # # Создаем авторизованый клиент
         self.user = ImageInPostView.user
         self.authorized_client = Client()
@@ -272,6 +363,146 @@ class ImageInPostView(TestCase):
                 self.assertEqual(first_object, self.post)
                 self.assertEqual(first_object.image, self.post.image)
 
+    def test_thumbnail_generated_ahead(self):
+        """Пока миниатюры нет, в ленте исходная картинка; после фоновой
+        генерации — миниатюра из хранилища sorl.
+        """
+        self.assertIsNone(thumbnails.stored(self.post.image, 'card'))
+        self.assertContains(self.authorized_client.get(reverse('posts:index')),
+                            self.post.image.url)
+        thumbnails.generate(self.post.pk)
+        thumbnail = thumbnails.stored(self.post.image, 'card')
+        self.assertIsNotNone(thumbnail)
+        self.assertTrue(thumbnail.exists())
+        self.assertContains(self.authorized_client.get(reverse('posts:index')),
+                            thumbnail.url)
+
+    def image_url(self, width=320, fmt='jpg'):
+        return images.variant_url(self.post, 'card', width, fmt)
+
+    def test_image_variant(self):
+        """Вариант картинки нужной ширины с вечными заголовками кэша."""
+        response = self.client.get(self.image_url())
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        picture = Image.open(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(picture.size, images.variant_size('card', 320))
+        self.assertContains(self.client.get(reverse('posts:index')),
+                            self.image_url(480))
+
+    def test_image_variant_whitelist(self):
+        for url in (self.image_url(width=321), self.image_url(fmt='bmp')):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+        stale = self.image_url().replace(images.version(self.post.image),
+                                         'old')
+        self.assertRedirects(self.client.get(stale), self.image_url())
+
+    def test_picture_markup(self):
+        """<picture> с размерами и srcset; WebP, если его умеет Pillow."""
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, '<picture>')
+        self.assertContains(response, 'width="960" height="339"')
+        self.assertContains(response, 'loading="lazy"')
+        self.assertContains(response, self.post.image_placeholder)
+        if 'webp' in images.formats():
+            self.assertContains(response, 'type="image/webp"')
+            self.assertContains(response, self.image_url(320, 'webp'))
+
+    @skipUnless('webp' in images.formats(), 'Pillow без WebP')
+    def test_webp_variant(self):
+        response = self.client.get(self.image_url(fmt='webp'))
+        self.assertEqual(response['Content-Type'], 'image/webp')
+
+    def test_image_savings_report(self):
+        out = StringIO()
+        call_command('image_savings', stdout=out, stderr=StringIO())
+        self.assertIn('файлов: 1, пропущено: 0', out.getvalue())
+        self.assertIn('jpg', out.getvalue())
+
+    def test_gc_media(self):
+        """Сборщик удаляет только то, на что никто не ссылается."""
+        content = BytesIO()
+        Image.new('RGB', (30, 20), 'blue').save(content, 'PNG')
+        post = Post.objects.create(
+            author=self.user, text='gc',
+            image=SimpleUploadedFile('gc.png', content.getvalue()),
+        )
+        thumbnails.generate(post.pk)
+        thumbnail = thumbnails.stored(post.image, 'card')
+        orphan = image_storage.save('posts/orphan.txt',
+                                    ContentFile(b'orphan'))
+        stray = default_storage.save('cache/00/stray.jpg',
+                                     ContentFile(b'stray'))
+        variant = images.variant(post.image, 'card', 320, 'jpg')
+        out = StringIO()
+        call_command('gc_media', dry_run=True, min_age=0, stdout=out)
+        self.assertIn('картинки постов: будет удалено 1', out.getvalue())
+        self.assertTrue(image_storage.exists(orphan))
+        self.assertTrue(default_storage.exists(stray))
+        call_command('gc_media', min_age=0, stdout=StringIO())
+        self.assertFalse(image_storage.exists(orphan))
+        self.assertFalse(default_storage.exists(stray))
+        self.assertTrue(os.path.exists(variant))
+        self.assertTrue(image_storage.exists(post.image.name))
+        self.assertTrue(thumbnail.exists())
+        # пост сменил картинку в обход сигналов: старая и её миниатюры
+        # теперь мусор
+        Post.objects.filter(pk=post.pk).update(image='')
+        call_command('gc_media', min_age=0, stdout=StringIO())
+        self.assertFalse(thumbnail.exists())
+        self.assertFalse(image_storage.exists(post.image.name))
+
+    def test_regenerate_images(self):
+        """Команда создаёт миниатюры и варианты и продолжает с
+        контрольной точки.
+        """
+        checkpoint = os.path.join(TEMP_MEDIA_ROOT, 'checkpoint')
+        Post.objects.filter(pk=self.post.pk).update(image_placeholder='')
+        version = caching.get_versions(['index'])
+        call_command('regenerate_images', processes=0, checkpoint=checkpoint,
+                     stdout=StringIO())
+        # превью сменилось: закэшированные страницы устарели
+        self.assertNotEqual(caching.get_versions(['index']), version)
+        self.assertIsNotNone(thumbnails.stored(self.post.image, 'card'))
+        self.assertTrue(os.path.exists(
+            images.variant(self.post.image, 'card', 320, 'jpg')
+        ))
+        with open(checkpoint) as state:
+            self.assertEqual(json.load(state)['last_id'], self.post.pk)
+        out = StringIO()
+        call_command('regenerate_images', processes=0, checkpoint=checkpoint,
+                     stdout=out)
+        self.assertIn('готово: картинок 1, ошибок 0', out.getvalue())
+        self.assertNotIn('постов,', out.getvalue())
+
+    def test_image_variant_rendered_once(self):
+        """Параллельные запросы одного варианта рендерят его один раз."""
+        render = images.render
+        calls = []
+
+        def slow_render(*args):
+            calls.append(args)
+            time.sleep(0.1)
+            render(*args)
+
+        with mock.patch.object(images, 'render', slow_render):
+            workers = [
+                threading.Thread(target=images.variant,
+                                 args=(self.post.image, 'card', 640, 'png'))
+                for _ in range(4)
+            ]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        self.assertEqual(len(calls), 1)
+        path = images.variant(self.post.image, 'card', 640, 'png')
+        self.assertTrue(os.path.exists(path))
+        self.assertFalse([name for name in os.listdir(os.path.dirname(path))
+                          if name.endswith('.lock')])
+
 
 class CacheTests(TestCase):
     @classmethod
@@ -297,15 +528,124 @@ class CacheTests(TestCase):
     def test_cache_view(self):
         """Тест кэширования страницы index.html"""
         one_page = self.authorized_client.get(reverse('posts:index'))
-        post_edit = Post.objects.get(id=1)
-        post_edit.text = 'меняю текст'
-        post_edit.save()
+        # update() мимо сигналов: версия не меняется, страница из кэша
+        Post.objects.filter(id=self.post.id).update(text='меняю текст')
         two_page = self.authorized_client.get(reverse('posts:index'))
         self.assertEqual(one_page.content, two_page.content)
         cache.clear()
         three_page = self.authorized_client.get(reverse('posts:index'))
         self.assertNotEqual(one_page.content, three_page.content)
 
+    def test_cache_invalidated_on_change(self):
+        """Сохранение поста и комментарий сразу сбрасывают кэш страниц."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        )
+        for url in urls:
+            self.authorized_client.get(url)
+        hits = caching.stats()['index']['hit']
+        self.authorized_client.get(reverse('posts:index'))
+        self.assertEqual(caching.stats()['index']['hit'], hits + 1)
+        post = Post.objects.get(id=self.post.id)
+        post.text = 'новый текст'
+        post.save()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.authorized_client.get(url),
+                                    'новый текст')
+        self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            data={'text': 'свежий комментарий'},
+        )
+        self.assertContains(self.authorized_client.get(urls[-1]),
+                            'свежий комментарий')
+
+    def test_group_delete_invalidates_pages(self):
+        group_url = reverse('posts:group_list',
+                            kwargs={'slug': self.group.slug})
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        )
+        for url in urls:
+            self.assertContains(self.authorized_client.get(url), group_url)
+        self.group.delete()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertNotContains(self.authorized_client.get(url),
+                                       group_url)
+        self.assertEqual(self.client.get(group_url).status_code, 404)
+
+    def test_post_cards_cached(self):
+        """Карточки рендерятся один раз и заново только после правки."""
+        template = 'includes/post_card.html'
+        posts = list(Post.objects.for_listing())
+        first = caching.post_cards(posts, template)
+        with mock.patch.object(caching, 'render_to_string') as render:
+            self.assertEqual(caching.post_cards(posts, template), first)
+            render.assert_not_called()
+        Post.objects.filter(pk=self.post.pk).update(text='правка')
+        posts = list(Post.objects.for_listing())
+        cards = caching.post_cards(posts, template)
+        self.assertIn('правка', cards[0])
+
+    def test_cached_page_shared_between_users(self):
+        """Одна копия страницы в кэше, шапка у каждого своя."""
+        reader = User.objects.create_user(username='reader')
+        reader_client = Client()
+        reader_client.force_login(reader)
+        url = reverse('posts:profile', kwargs={'username': self.user.username})
+        author_page = self.authorized_client.get(url)
+        hits = caching.stats()['profile']['hit']
+        reader_page = reader_client.get(url)
+        guest_page = Client().get(url)
+        self.assertEqual(caching.stats()['profile']['hit'], hits + 2)
+        self.assertContains(author_page, 'Пользователь: test_user')
+        self.assertNotContains(author_page, 'Подписаться')
+        self.assertContains(reader_page, 'Пользователь: reader')
+        self.assertContains(reader_page, 'Подписаться')
+        self.assertNotContains(guest_page, 'Пользователь:')
+        self.assertNotContains(guest_page, '<!--hole:')
+
+    def test_login_keeps_profile_cached(self):
+        scope = f'profile:{self.user.username}'
+        version = caching.get_versions([scope])
+        # force_login в setUp уже обновил last_login
+        self.authorized_client.force_login(self.user)
+        self.assertEqual(caching.get_versions([scope]), version)
+
+    def test_hot_author_without_private_fields(self):
+        caches['hot'].clear()
+        caching.hot_author(self.user.username)
+        author = caches['default'].get(
+            caches['hot'].make_key(f'user:{self.user.username}')
+        )
+        self.assertEqual(author.pk, self.user.pk)
+        self.assertNotIn('password', author.__dict__)
+
+    def test_profile_author_from_hot_cache(self):
+        url = reverse('posts:profile', kwargs={'username': self.user.username})
+        self.client.get(url)
+        caching.bump(f'profile:{self.user.username}')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertContains(response, 'Всего постов: 1')
+        self.assertFalse([query for query in queries
+                          if 'FROM "auth_user"' in query['sql']])
+
+    def test_unknown_params_share_cached_page(self):
+        url = reverse('posts:index')
+        self.client.get(url)
+        hits = caching.stats()['index']['hit']
+        self.client.get(url, {'utm_source': 'mail'})
+        self.assertEqual(caching.stats()['index']['hit'], hits + 1)
+        self.client.get(url, {'page': 2})
+        self.assertEqual(caching.stats()['index']['hit'], hits + 1)
+
 
 class FollowTest(TestCase):
     @classmethod
@@ -350,3 +690,206 @@ class FollowTest(TestCase):
                                           kwargs={'username':
                                                   self.user.username}))
         self.assertEqual(response.status_code, 302)
+
+    def test_new_post_in_follower_feed(self):
+        """Новый пост автора попадает в ленту подписчика."""
+        self.follower_client.get(reverse('posts:profile_follow',
+                                 kwargs={'username': self.user.username}))
+        post = Post.objects.create(text='Новый пост', author=self.user)
+        self.assertTrue(FeedItem.objects.filter(user=self.follower,
+                                                post=post).exists())
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        self.assertIn(post, response.context['page_obj'])
+        self.assertIn(self.post, response.context['page_obj'])
+
+    def test_unfollow_clears_feed(self):
+        self.follower_client.get(reverse('posts:profile_follow',
+                                 kwargs={'username': self.user.username}))
+        self.follower_client.get(reverse('posts:profile_unfollow',
+                                 kwargs={'username': self.user.username}))
+        self.assertFalse(FeedItem.objects.filter(user=self.follower).exists())
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_celebrity_post_merged_on_read(self):
+        """Посты популярного автора не рассылаются, но видны в ленте."""
+        Follow.objects.create(user=self.follower, author=self.user)
+        post = Post.objects.create(text='Пост звезды', author=self.user)
+        self.assertFalse(post.fanned_out)
+        self.assertFalse(FeedItem.objects.filter(post=post).exists())
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        self.assertIn(post, response.context['page_obj'])
+
+    @override_settings(FEED_MAX_ITEMS=2)
+    def test_feed_is_capped(self):
+        Follow.objects.create(user=self.follower, author=self.user)
+        for num in range(3):
+            Post.objects.create(text=f'Пост {num}', author=self.user)
+        self.assertEqual(FeedItem.objects.filter(user=self.follower).count(),
+                         2)
+
+    @override_settings(FEED_FANOUT_LIMIT=2, POSTS_PER_PAGE=2)
+    def test_feed_pages_merge_celebrity_posts(self):
+        star = User.objects.create_user(username='star')
+        fan = User.objects.create_user(username='fan')
+        Follow.objects.create(user=self.follower, author=self.user)
+        Follow.objects.create(user=self.follower, author=star)
+        Follow.objects.create(user=fan, author=star)
+        posts = [self.post]
+        for num in range(3):
+            posts.append(Post.objects.create(text=f'Звезда {num}',
+                                             author=star))
+            posts.append(Post.objects.create(text=f'Автор {num}',
+                                             author=self.user))
+        seen = []
+        url = reverse('posts:follow_index')
+        while url:
+            page = self.follower_client.get(url).context['page_obj']
+            seen += page
+            url = page.next_cursor and (reverse('posts:follow_index')
+                                        + f'?after={page.next_cursor}')
+        self.assertEqual(seen, posts[::-1])
+
+    @override_settings(FEED_FANOUT_LIMIT=2, FEED_DEMOTE_LIMIT=2)
+    def test_former_celebrity_posts_stay_merged(self):
+        """Отписка не рассылает старые посты: они подмешиваются при
+        чтении, а рассылаются только новые.
+        """
+        fan = User.objects.create_user(username='fan')
+        Follow.objects.create(user=self.follower, author=self.user)
+        follow = Follow.objects.create(user=fan, author=self.user)
+        old = Post.objects.create(text='Пост звезды', author=self.user)
+        follow.delete()
+        self.assertFalse(FeedItem.objects.filter(post=old).exists())
+        new = Post.objects.create(text='Новый пост', author=self.user)
+        self.assertTrue(FeedItem.objects.filter(user=self.follower,
+                                                post=new).exists())
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']),
+                         [new, old, self.post])
+
+    @override_settings(FEED_FANOUT_LIMIT=3, FEED_DEMOTE_LIMIT=2)
+    def test_fanout_mode_has_hysteresis(self):
+        fans = [User.objects.create_user(username=f'fan{num}')
+                for num in range(2)]
+        Follow.objects.create(user=self.follower, author=self.user)
+        Follow.objects.create(user=fans[0], author=self.user)
+        # два подписчика: ниже порога, посты рассылаются
+        post = Post.objects.create(text='Пост 1', author=self.user)
+        self.assertTrue(post.fanned_out)
+        follow = Follow.objects.create(user=fans[1], author=self.user)
+        post = Post.objects.create(text='Пост 2', author=self.user)
+        self.assertFalse(post.fanned_out)
+        # отписка у порога не возвращает рассылку
+        follow.delete()
+        post = Post.objects.create(text='Пост 3', author=self.user)
+        self.assertFalse(post.fanned_out)
+        Follow.objects.get(user=fans[0]).delete()
+        post = Post.objects.create(text='Пост 4', author=self.user)
+        self.assertTrue(post.fanned_out)
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='writer',
+                                            first_name='Лев',
+                                            last_name='Толстой')
+        cls.group = Group.objects.create(title='Классика', slug='classic',
+                                         description='Тестовое описание')
+        cls.in_text = Post.objects.create(
+            text='Все счастливые семьи похожи друг на друга',
+            author=cls.user,
+        )
+        cls.in_group = Post.objects.create(
+            text='Война и мир', author=cls.user, group=cls.group,
+        )
+
+    def search(self, query, **params):
+        return self.client.get(reverse('posts:search'),
+                               {'q': query, **params})
+
+    def test_ranked_and_highlighted(self):
+        response = self.search('счастливые')
+        posts = response.context['posts']
+        self.assertEqual(posts, [self.in_text])
+        self.assertIn('<mark>счастливые</mark>', posts[0].snippet)
+        # совпадение в названии группы весит больше, чем в тексте
+        Post.objects.create(text='Классика жанра', author=self.user)
+        posts = self.search('классик').context['posts']
+        self.assertEqual(posts[0], self.in_group)
+        self.assertEqual(len(posts), 2)
+
+    def test_query_syntax_is_escaped(self):
+        response = self.search('"мир" OR NEAR(')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['posts'], [])
+
+    def test_index_follows_changes(self):
+        post = Post.objects.get(pk=self.in_text.pk)
+        post.text = 'Все несчастливые семьи'
+        post.save()
+        self.assertEqual(self.search('несчастливые').context['posts'],
+                         [self.in_text])
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Роман'
+        group.save()
+        self.assertEqual(self.search('роман').context['posts'],
+                         [self.in_group])
+        user = User.objects.get(pk=self.user.pk)
+        user.last_name = 'Николаевич'
+        user.save(update_fields=['last_name'])
+        self.assertEqual(len(self.search('николаевич').context['posts']), 2)
+        group.delete()
+        self.assertEqual(self.search('роман').context['posts'], [])
+        self.assertEqual(self.search('война').context['posts'],
+                         [self.in_group])
+        Post.objects.filter(pk=self.in_group.pk).delete()
+        self.assertEqual(self.search('война').context['posts'], [])
+
+    @override_settings(POSTS_PER_PAGE=1)
+    def test_cursor_pages(self):
+        first = self.search('толстой')
+        self.assertEqual(len(first.context['posts']), 1)
+        cursor = first.context['next_cursor']
+        self.assertIsNotNone(cursor)
+        second = self.search('толстой', after=cursor)
+        self.assertEqual(len(second.context['posts']), 1)
+        self.assertNotEqual(first.context['posts'], second.context['posts'])
+        self.assertIsNone(second.context['next_cursor'])
+
+    def test_like_fallback_matches_author_name(self):
+        with mock.patch.object(search, 'enabled', return_value=False):
+            for query in ('Лев', 'Толстой'):
+                with self.subTest(query=query):
+                    self.assertEqual(len(search.search(query)[0]), 2)
+
+    def test_rebuild_search(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM posts_post_fts')
+        call_command('rebuild_search', stdout=StringIO())
+        self.assertEqual(self.search('война').context['posts'],
+                         [self.in_group])
+
+
+class ViewBenchmarkTest(TestCase):
+    def test_report(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'bench.json')
+            call_command('view_benchmark', users=20, groups=2, posts=50,
+                         comments=30, follows=40, requests=3, traced=1,
+                         output=output, stdout=StringIO())
+            with open(output) as report:
+                views = json.load(report)['views']
+        self.assertEqual(set(views), {
+            'index', 'group_posts', 'profile', 'post_detail',
+            'follow_index', 'post_create', 'add_comment',
+        })
+        for result in views.values():
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+            self.assertGreater(result['queries'], 0)
+            self.assertGreater(result['allocated_bytes'], 0)
+        # данные бенчмарка откатываются
+        self.assertFalse(Post.objects.exists())
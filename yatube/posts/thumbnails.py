@@ -0,0 +1,143 @@
+"""Миниатюры картинок постов готовятся заранее, в фоновых потоках.
+
+Запрос страницы только ищет готовую миниатюру в хранилище sorl и,
+пока её нет, показывает исходную картинку. С THUMBNAIL_WORKERS = 0
+(так в тестах) миниатюры создаются сразу после коммита в том же
+потоке.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.images import ImageFile
+
+from core import metrics
+
+from . import images
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_pid = None
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+class StoredThumbnailBackend(ThumbnailBackend):
+    def get_stored(self, file_, geometry_string, **options):
+        """Миниатюра из хранилища sorl или None; картинку не читает.
+
+        Параметры дополняются так же, как в get_thumbnail(), чтобы
+        имя миниатюры совпало с созданной им.
+        """
+        source = ImageFile(file_)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return default.kvstore.get(ImageFile(name, default.storage))
+
+
+backend = StoredThumbnailBackend()
+
+
+def _get_executor():
+    # пул создаётся в каждом процессе заново: потоки не переживают fork
+    global _executor, _executor_pid
+    if _executor_pid != os.getpid():
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            thread_name_prefix='thumbnails',
+        )
+        _executor_pid = os.getpid()
+    return _executor
+
+
+def stored(image, geometry):
+    """Готовая миниатюра картинки для геометрии из
+    THUMBNAIL_GEOMETRIES или None, если она ещё не создана.
+    """
+    size, options = settings.THUMBNAIL_GEOMETRIES[geometry]
+    return backend.get_stored(image, size, **options)
+
+
+def generate(post_id):
+    """Создаёт все миниатюры картинки поста и сбрасывает кэш страниц,
+    где до этого показывалась исходная картинка.
+    """
+    from .models import Post
+    from .signals import post_scopes
+    from . import caching
+    try:
+        post = Post.objects.select_related('author').filter(
+            pk=post_id
+        ).first()
+        if not post or not post.image:
+            return
+        if not post.image.storage.exists(post.image.name):
+            return
+        for geometry, (size, options) in settings.THUMBNAIL_GEOMETRIES.items():
+            started = time.perf_counter()
+            get_thumbnail(post.image, size, **options)
+            metrics.observe('yatube_thumbnail_duration_seconds',
+                            time.perf_counter() - started,
+                            geometry=geometry)
+        caching.bump(*post_scopes(post, post.group_id))
+    except Exception:
+        logger.exception('Не удалось создать миниатюры поста %s', post_id)
+
+
+def regenerate(image, force=False):
+    """Создаёт все миниатюры THUMBNAIL_GEOMETRIES и все варианты
+    картинки; с force сначала удаляет уже готовые.
+    """
+    if force:
+        default.kvstore.delete_thumbnails(ImageFile(image))
+        images.delete_variants(images.digest(image))
+    for size, options in settings.THUMBNAIL_GEOMETRIES.values():
+        get_thumbnail(image, size, **options)
+    for geometry in settings.THUMBNAIL_GEOMETRIES:
+        for width in settings.IMAGE_VARIANT_WIDTHS:
+            for fmt in images.formats():
+                images.variant(image, geometry, width, fmt)
+
+
+def _submit(post_id):
+    if not settings.THUMBNAIL_WORKERS:
+        generate(post_id)
+        return
+    with _pending_lock:
+        if post_id in _pending:
+            return
+        _pending.add(post_id)
+    _get_executor().submit(_work, post_id)
+
+
+def _work(post_id):
+    try:
+        generate(post_id)
+    finally:
+        with _pending_lock:
+            _pending.discard(post_id)
+        # у потока пула своё соединение с базой
+        connection.close()
+
+
+def schedule(post):
+    """Ставит создание миниатюр поста в очередь после коммита."""
+    if post.image:
+        post_id = post.pk
+        transaction.on_commit(lambda: _submit(post_id))
@@ -0,0 +1,116 @@
+"""Приём картинок постов.
+
+ImageUploadHandler пишет загрузку на диск, а не в память, и
+перестаёт принимать данные, как только по заголовку видно, что
+картинка слишком велика. normalize() перед сохранением уменьшает
+картинку до IMAGE_MAX_SIDE, поворачивает по EXIF и выбрасывает
+метаданные.
+"""
+import os
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from PIL import Image, ImageOps
+
+# сколько байт начала файла хватает, чтобы прочитать заголовок
+HEADER_BYTES = 64 * 1024
+# форматы, которые сохраняем как есть, если картинку не нужно менять
+KEEP_FORMATS = {'JPEG', 'PNG', 'GIF', 'WEBP'}
+TOO_LARGE = 'Изображение слишком большое.'
+
+
+def too_large(size):
+    width, height = size
+    return width * height > settings.IMAGE_MAX_PIXELS
+
+
+class ImageUploadHandler(TemporaryFileUploadHandler):
+    """Потоковая загрузка во временный файл с ранним отказом."""
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.head = b''
+        self.rejected = False
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.rejected:
+            return None
+        if start + len(raw_data) > settings.IMAGE_UPLOAD_MAX_BYTES:
+            # недокачанный файл не пройдёт проверку ImageField
+            self.rejected = True
+            return None
+        if self.head is not None:
+            self.check_header(raw_data)
+            if self.rejected:
+                return None
+        self.file.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        upload = super().file_complete(file_size)
+        upload.rejected = self.rejected
+        return upload
+
+    def check_header(self, raw_data):
+        self.head += raw_data
+        try:
+            with Image.open(BytesIO(self.head)) as image:
+                self.rejected = too_large(image.size)
+        except (OSError, Image.DecompressionBombError):
+            if len(self.head) < HEADER_BYTES:
+                return
+        # заголовок прочитан (или это не картинка) — дальше не смотрим
+        self.head = None
+
+
+def _keep_as_is(image):
+    if image.format not in KEEP_FORMATS:
+        return False
+    if max(image.size) > settings.IMAGE_MAX_SIDE:
+        return False
+    # у анимации нет EXIF, а перекодирование оставило бы один кадр
+    return getattr(image, 'is_animated', False) or not image.getexif()
+
+
+def normalize(upload):
+    """Загруженная картинка, готовая к сохранению.
+
+    Файл без EXIF и не больше IMAGE_MAX_SIDE возвращается как есть,
+    остальные уменьшаются и перекодируются в JPEG (или PNG, если есть
+    прозрачность) во временный файл.
+    """
+    upload.seek(0)
+    try:
+        image = Image.open(upload)
+    except Image.DecompressionBombError:
+        raise ValidationError(TOO_LARGE, code='too_large')
+    with image:
+        if too_large(image.size):
+            raise ValidationError(TOO_LARGE, code='too_large')
+        if _keep_as_is(image):
+            upload.seek(0)
+            return upload
+        limit = (settings.IMAGE_MAX_SIDE, settings.IMAGE_MAX_SIDE)
+        # JPEG декодируется сразу в уменьшенном в 2^n раз масштабе
+        image.draft('RGB', limit)
+        picture = ImageOps.exif_transpose(image)
+    # thumbnail() сначала грубо ужимает через reduce(), потом сглаживает
+    picture.thumbnail(limit, Image.LANCZOS, reducing_gap=3.0)
+    has_alpha = (picture.mode in ('RGBA', 'LA')
+                 or 'transparency' in picture.info)
+    image_format, extension = ('PNG', 'png') if has_alpha else ('JPEG', 'jpg')
+    if image_format == 'PNG' and picture.mode not in ('RGBA', 'LA'):
+        picture = picture.convert('RGBA')
+    elif image_format == 'JPEG' and picture.mode != 'RGB':
+        picture = picture.convert('RGB')
+    name = f'{os.path.splitext(upload.name)[0]}.{extension}'
+    # безымянный временный файл: хранилище скопирует его и он исчезнет
+    content = tempfile.TemporaryFile(dir=settings.FILE_UPLOAD_TEMP_DIR)
+    picture.save(content, image_format, optimize=True,
+                 quality=settings.IMAGE_UPLOAD_QUALITY)
+    size = content.tell()
+    content.seek(0)
+    return UploadedFile(content, name, Image.MIME[image_format], size)
@@ -15,6 +15,15 @@ urlpatterns = [
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
     path('posts/<int:post_id>/comment/', views.add_comment,
          name='add_comment'),
+    path('posts/<int:post_id>/comments/', views.comments_more,
+         name='comments_more'),
+    path(
+        'posts/<int:post_id>/image/<str:version>/'
+        '<slug:geometry>-<int:width>.<slug:fmt>',
+        views.post_image,
+        name='post_image'
+    ),
+    path('search/', views.search, name='search'),
     path('follow/', views.follow_index, name='follow_index'),
     path(
         'profile/<str:username>/follow/',
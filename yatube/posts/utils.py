@@ -1,10 +1,175 @@
-from django.core.paginator import Paginator
+from django.core.paginator import Paginator, Page
 from django.conf import settings
+from django.db import connections
+from django.utils.functional import cached_property
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
+
+
+def encode_cursor(value, pk):
+    """Непрозрачный токен курсора из пары (дата, id)."""
+    raw = f'{value.isoformat()}|{pk}'.encode()
+    return urlsafe_base64_encode(raw)
+
+
+def decode_cursor(token):
+    """Обратное к encode_cursor; на мусор возвращает None."""
+    try:
+        value, pk = urlsafe_base64_decode(token).decode().split('|')
+        value = parse_datetime(value)
+        pk = int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if value is None:
+        return None
+    return value, pk
+
+
+class CursorPaginator(Paginator):
+    """Пагинация по ключу (field, pk): без COUNT и без OFFSET,
+    поэтому любая страница стоит одинаково.
+    """
+    cursor = True
+
+    def __init__(self, object_list, per_page, field='pub_date'):
+        super().__init__(object_list, per_page)
+        self.field = field
+
+    def _after(self, queryset, cursor, pk='pk'):
+        value, key = cursor
+        # условие field <= value лишнее по смыслу, но без него SQLite
+        # не ищет начало страницы по индексу, а просматривает индекс
+        # с начала: чем дальше страница, тем она дороже
+        return queryset.filter(
+            Q(**{f'{self.field}__lte': value}),
+            Q(**{f'{self.field}__lt': value})
+            | Q(**{self.field: value, f'{pk}__lt': key})
+        )
+
+    def _before(self, queryset, cursor, pk='pk'):
+        value, key = cursor
+        return queryset.filter(
+            Q(**{f'{self.field}__gte': value}),
+            Q(**{f'{self.field}__gt': value})
+            | Q(**{self.field: value, f'{pk}__gt': key})
+        )
+
+    def _cursor(self, obj):
+        return encode_cursor(getattr(obj, self.field), obj.pk)
+
+    def _ordered(self, queryset, after=None, before=None, pk='pk'):
+        """Выборка после курсора after по убыванию ключа (field, pk)
+        или перед before по возрастанию."""
+        if before:
+            return self._before(queryset, before, pk).order_by(
+                self.field, pk)
+        if after:
+            queryset = self._after(queryset, after, pk)
+        return queryset.order_by(f'-{self.field}', f'-{pk}')
+
+    def _fetch(self, after, before, limit):
+        return list(self._ordered(self.object_list, after, before)[:limit])
+
+    def get_cursor_page(self, after=None, before=None):
+        after = after and decode_cursor(after)
+        before = before and decode_cursor(before)
+        items = self._fetch(after, before, self.per_page + 1)
+        if before:
+            has_previous = len(items) > self.per_page
+            items = items[:self.per_page][::-1]
+            has_next = True
+            if not items:
+                return self.get_cursor_page()
+        else:
+            has_next = len(items) > self.per_page
+            items = items[:self.per_page]
+            has_previous = bool(after)
+        page = Page(items, 1, self)
+        page.next_cursor = None
+        page.previous_cursor = None
+        if items and has_next:
+            page.next_cursor = self._cursor(items[-1])
+        if items and has_previous:
+            page.previous_cursor = self._cursor(items[0])
+        return page
+
+
+def table_size(model, using='default'):
+    """Примерное число строк в таблице модели без COUNT(*) или None.
+
+    PostgreSQL хранит оценку в pg_class.reltuples, в SQLite
+    наибольший rowid — почти число строк, если их редко удаляют.
+    """
+    connection = connections[using]
+    table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s'
+                           '::regclass', [model._meta.db_table])
+        elif connection.vendor == 'sqlite':
+            cursor.execute(f'SELECT max(rowid) FROM {table}')
+        else:
+            return None
+        row = cursor.fetchone()
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор, который не считает COUNT(*) по большим выборкам.
+
+    Без фильтров число строк берётся из оценки размера таблицы, с
+    фильтрами считается не дальше limit строк. Если выборка больше
+    limit, estimated равно True; exact=True включает точный подсчёт.
+    """
+    limit = 10000
+
+    def __init__(self, *args, exact=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.exact = exact
+        self.estimated = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not self.exact and hasattr(queryset, 'query'):
+            if not queryset.query.where:
+                estimate = table_size(queryset.model, queryset.db)
+            else:
+                estimate = queryset.order_by()[:self.limit + 1].count()
+            if estimate is not None and estimate > self.limit:
+                self.estimated = True
+                return estimate
+        return super().count
+
+
+def cursor_context(paginator, request):
+    page_obj = paginator.get_cursor_page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+    return {
+        'paginator': paginator,
+        'page_number': None,
+        'page_obj': page_obj
+    }
+
+
+def cursor_pagin(queryset, request, per_page=None, field='pub_date'):
+    paginator = CursorPaginator(
+        queryset, per_page or settings.POSTS_PER_PAGE, field
+    )
+    return cursor_context(paginator, request)
 
 
 def page_pagin(queryset, request):
-    paginator = Paginator(queryset, settings.POSTS_PER_PAGE)
     page_number = request.GET.get('page')
+    # старые ссылки вида ?page=N продолжают работать через OFFSET
+    if settings.POSTS_CURSOR_PAGINATION and not page_number:
+        return cursor_pagin(queryset, request)
+    paginator = Paginator(queryset, settings.POSTS_PER_PAGE)
     page_obj = paginator.get_page(page_number)
     return {
         'paginator': paginator,
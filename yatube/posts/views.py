@@ -1,58 +1,120 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from .models import Post, Group, User, Comment, Follow
+from django.http import FileResponse, Http404
+from .models import Post, User, Comment, Follow, UserCounters
 from .forms import PostForm, CommentForm
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import get_user_model
-from .utils import page_pagin
-from django.views.decorators.cache import cache_page
+from django.db import transaction
+from .utils import page_pagin, cursor_context, cursor_pagin
+from django.conf import settings
+from PIL import Image
+from . import feed, images, search as post_search, thumbnails
+from .caching import cached_page, hot_group, hot_author
 
 
 User = get_user_model()
 
 
-@cache_page(60 * 20, key_prefix='page_number')
+@cached_page('index')
 def index(request):
-    context = page_pagin(Post.objects.all(), request)
+    context = page_pagin(Post.objects.for_listing(), request)
     return render(request, 'posts/index.html', context)
 
 
+@cached_page('group:{slug}')
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
+    group = hot_group(slug)
     context = {
         'group': group,
     }
-    context.update(page_pagin(group.posts.all(), request))
+    context.update(page_pagin(group.posts.for_listing(), request))
     return render(request, 'posts/group_list.html', context)
 
 
+@cached_page('profile:{username}')
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    if request.user.is_authenticated:
-        following = Follow.objects.filter(user=request.user,
-                                          author=author).exists()
-    else:
-        following = False
+    author = hot_author(username)
+    # счётчики меняются часто, в горячий кэш с автором их не кладём
+    counters = (UserCounters.objects.filter(user=author).first()
+                or UserCounters(user=author))
     context = {
         'author': author,
-        'following': following,
+        'counters': counters,
     }
-    context.update(page_pagin(author.posts.all(), request))
+    context.update(page_pagin(author.posts.for_listing(), request))
     return render(request, 'posts/profile.html', context)
 
 
+@cached_page('post:{post_id}')
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__counters', 'group'),
+        pk=post_id
+    )
     form = CommentForm(request.POST or None)
-    comments = Comment.objects.all
     context = {
         'post': post,
         'form': form,
-        'comments': comments
+        'comments': post_comments(request, post_id),
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def post_comments(request, post_id):
+    comments = Comment.objects.filter(post_id=post_id).select_related(
+        'author'
+    )
+    return cursor_pagin(comments, request, settings.COMMENTS_PER_PAGE,
+                        field='created')['page_obj']
+
+
+def comments_more(request, post_id):
+    """Следующая порция комментариев для кнопки «Показать ещё»."""
+    context = {
+        'post_id': post_id,
+        'comments': post_comments(request, post_id),
+    }
+    return render(request, 'includes/comments.html', context)
+
+
+def search(request):
+    """Поиск по тексту постов, группам и авторам."""
+    query = request.GET.get('q', '').strip()
+    posts, next_cursor = post_search.search(query, request.GET.get('after'))
+    context = {
+        'query': query,
+        'posts': posts,
+        'next_cursor': next_cursor,
+    }
+    return render(request, 'posts/search.html', context)
+
+
+def post_image(request, post_id, version, geometry, width, fmt):
+    """Картинка поста шириной width из IMAGE_VARIANT_WIDTHS."""
+    post = get_object_or_404(Post.objects.only('image'), id=post_id)
+    if (not post.image
+            or geometry not in settings.THUMBNAIL_GEOMETRIES
+            or width not in settings.IMAGE_VARIANT_WIDTHS
+            or fmt not in images.formats()):
+        raise Http404
+    if version != images.version(post.image):
+        # картинку заменили: старый адрес ведёт на новую
+        return redirect(images.variant_url(post, geometry, width, fmt))
+    try:
+        path = images.variant(post.image, geometry, width, fmt)
+    except OSError:
+        raise Http404
+    response = FileResponse(
+        open(path, 'rb'),
+        content_type=Image.MIME[settings.IMAGE_VARIANT_FORMATS[fmt]],
+    )
+    # адрес меняется вместе с картинкой, поэтому кэшировать можно навсегда
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+
 @login_required
+@transaction.atomic
 def post_create(request):
     form = PostForm(
         request.POST or None,
@@ -62,6 +124,7 @@ def post_create(request):
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        thumbnails.schedule(post)
         return redirect('posts:profile', post.author)
     context = {
         'form': form,
@@ -70,6 +133,7 @@ def post_create(request):
 
 
 @login_required
+@transaction.atomic
 def post_edit(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     is_edit = True
@@ -82,6 +146,8 @@ def post_edit(request, post_id):
     )
     if form.is_valid():
         form.save()
+        if 'image' in form.changed_data:
+            thumbnails.schedule(post)
         return redirect('posts:post_detail', post_id)
     context = {
         'form': form,
@@ -92,6 +158,7 @@ def post_edit(request, post_id):
 
 
 @login_required
+@transaction.atomic
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     form = CommentForm(request.POST or None)
@@ -105,15 +172,17 @@ def add_comment(request, post_id):
 
 @login_required
 def follow_index(request):
-    context = page_pagin(Post.objects.
-                         filter(author__following__user=request.user), request)
+    context = cursor_context(
+        feed.FeedPaginator(request.user, settings.POSTS_PER_PAGE), request
+    )
 
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
-    author = get_object_or_404(User, username=username)
+    author = hot_author(username)
     user = request.user
     follower = Follow.objects.filter(
         user=user,
@@ -128,8 +197,9 @@ def profile_follow(request, username):
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
-    author = get_object_or_404(User, username=username)
+    author = hot_author(username)
     user = request.user
     follower = Follow.objects.filter(
         user=user,
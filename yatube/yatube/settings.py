@@ -1,4 +1,8 @@
+import atexit
 import os
+import shutil
+import sys
+import tempfile
 from dotenv import load_dotenv
 from pathlib import Path
 
@@ -42,6 +46,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.StatsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -57,7 +62,8 @@ TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates с замером времени отрисовки (см. core.stats)
+        'BACKEND': 'core.stats.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -127,6 +133,18 @@ STATIC_URL = '/static/'  # префикс для url
 STATIC_ROOT = os.path.join(BASE_DIR, 'static/')
 # количество постов на странице
 POSTS_PER_PAGE = 10
+# курсорная пагинация (?after=/?before=) вместо COUNT + OFFSET;
+# ссылки вида ?page=N продолжают обслуживаться обычным Paginator
+POSTS_CURSOR_PAGINATION = True
+# количество комментариев в одной порции на странице поста
+COMMENTS_PER_PAGE = 20
+# сколько записей хранится в ленте подписок одного пользователя
+FEED_MAX_ITEMS = 500
+# с этого числа подписчиков посты автора не рассылаются по лентам,
+# а подмешиваются в ленту при чтении
+FEED_FANOUT_LIMIT = 1000
+# рассылка снова включается, только когда подписчиков меньше этого
+FEED_DEMOTE_LIMIT = 900
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 #  подключаем движок filebased.EmailBackend
@@ -137,8 +155,77 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# сколько живёт закэшированная страница; устаревает она раньше,
+# как только меняются её данные (см. posts.caching)
+PAGE_CACHE_TIMEOUT = 60 * 60 * 6
+# карточки постов в лентах; ключ меняется при правке поста
+POST_CARD_TIMEOUT = 60 * 60 * 24
+# миниатюры, которые создаются сразу после загрузки картинки:
+# имя -> (геометрия, параметры sorl get_thumbnail)
+THUMBNAIL_GEOMETRIES = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+# потоков для фонового создания миниатюр; 0 — создавать сразу
+THUMBNAIL_WORKERS = 2
+# загрузки пишутся во временный файл (см. posts.uploads), картинки
+# больше IMAGE_MAX_PIXELS отклоняются, больше IMAGE_MAX_SIDE уменьшаются
+FILE_UPLOAD_HANDLERS = ['posts.uploads.ImageUploadHandler']
+IMAGE_UPLOAD_MAX_BYTES = 20 * 1024 * 1024
+IMAGE_MAX_PIXELS = 40 * 1000 * 1000
+IMAGE_MAX_SIDE = 2560
+IMAGE_UPLOAD_QUALITY = 85
+# картинку, загруженную заново меньше стольких секунд назад, не удаляем
+# вместе с последним ссылавшимся на неё постом
+IMAGE_RELEASE_GRACE = 60
+# варианты картинок постов (posts:post_image): допустимые ширины
+# и форматы, расширение -> формат Pillow
+IMAGE_VARIANT_WIDTHS = (320, 480, 640, 960)
+IMAGE_VARIANT_FORMATS = {'jpg': 'JPEG', 'png': 'PNG', 'webp': 'WEBP'}
+IMAGE_VARIANT_QUALITY = 80
+# форматы, которые <picture> предлагает до JPEG (если их умеет Pillow)
+IMAGE_PICTURE_SOURCES = ('webp',)
+# показатели запросов (core.middleware.StatsMiddleware) в заголовке
+# Server-Timing; сводка по представлениям всегда есть в /admin/stats/
+REQUEST_STATS_SERVER_TIMING = DEBUG
+# общий для процессов файл метрик Prometheus (core.metrics) и адреса,
+# с которых /metrics доступен без входа; за обратным прокси
+# REMOTE_ADDR — адрес прокси, туда /metrics лучше не пропускать
+METRICS_DB = os.path.join(BASE_DIR, 'metrics.sqlite3')
+METRICS_ALLOWED_IPS = ('127.0.0.1', '::1')
+# общий для всех процессов кэш в файле SQLite (см. core.cache.sqlite)
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.cache.sqlite.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_SIZE': 256 * 1024 * 1024,
+        },
+    },
+    # горячие объекты (группы, авторы): LRU в памяти процесса
+    # перед общим кэшем 'default'
+    'hot': {
+        'BACKEND': 'core.cache.tiered.TieredCache',
+        'LOCATION': 'default',
+        'TIMEOUT': 300,
+        'KEY_PREFIX': 'hot',
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+            'MAX_BYTES': 8 * 1024 * 1024,
+            'LOCAL_TIMEOUT': 5,
+            'GENERATION_CHECK': 1,
+        },
+    },
 }
+
+# под тестами (manage.py test или pytest) кэш и метрики живут во
+# временной папке: тесты очищают кэш и не должны трогать файлы
+# сервера разработки; миниатюры создаются сразу, без потоков, которые
+# пережили бы тест и его временную MEDIA_ROOT
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+if TESTING:
+    TEST_DATA_DIR = tempfile.mkdtemp(prefix='yatube-tests-')
+    atexit.register(shutil.rmtree, TEST_DATA_DIR, ignore_errors=True)
+    CACHES['default']['LOCATION'] = os.path.join(TEST_DATA_DIR,
+                                                 'cache.sqlite3')
+    METRICS_DB = os.path.join(TEST_DATA_DIR, 'metrics.sqlite3')
+    THUMBNAIL_WORKERS = 0
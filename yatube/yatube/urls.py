@@ -1,9 +1,13 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from core.views import prometheus_metrics, request_stats
+
 
 urlpatterns = [
     path('', include('posts.urls', namespace='posts')),
+    path('metrics', prometheus_metrics, name='metrics'),
+    path('admin/stats/', request_stats, name='request_stats'),
     path('admin/', admin.site.urls),
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),